@@ -20,7 +20,48 @@ if (!$product_id || !$action) {
     exit();
 }
 
-// Connect to MongoDB
+// Queue the activity with the recommendation API, which stores events in batches
+$recommendation_api = getenv('RECOMMENDATION_API_URL') ?: 'http://localhost:5000';
+$response = @file_get_contents(
+    $recommendation_api . '/api/activities',
+    false,
+    stream_context_create(['http' => [
+        'method' => 'POST',
+        'header' => 'Content-Type: application/json',
+        'content' => json_encode([
+            'userId' => $user_email,
+            'action' => $action,
+            'metadata' => ['productId' => $product_id]
+        ]),
+        'timeout' => 0.5,
+        'ignore_errors' => true
+    ]])
+);
+$api_error = error_get_last();
+
+if (!empty($http_response_header)) {
+    // The API answered; only an accepted event counts as tracked
+    $status = (int) explode(' ', $http_response_header[0])[1];
+    if ($status === 202) {
+        echo json_encode(['success' => true, 'message' => 'Activity tracked successfully']);
+        exit();
+    }
+    // 4xx: the event was rejected (429: MongoDB is falling behind and writing
+    // directly would only add to its load); 5xx: the API may already have
+    // queued it. Either way a direct insert must not be attempted.
+    $body = json_decode($response, true);
+    http_response_code($status);
+    echo json_encode(['error' => $body['error'] ?? 'Failed to track activity']);
+    exit();
+}
+if ($api_error && stripos($api_error['message'], 'timed out') !== false) {
+    // The request may have reached the API, so a direct insert could store it twice
+    http_response_code(504);
+    echo json_encode(['error' => 'Activity tracking timed out, retry later']);
+    exit();
+}
+
+// No connection to the API could be made: store the activity directly
 require_once '../Login/connection.php';
 
 // Create activity document
@@ -36,8 +77,16 @@ $activity = [
 // Insert activity into MongoDB
 try {
     $result = $db->useractivities->insertOne($activity);
+
+    // Let the recommendation API drop its cached lists for this user
+    @file_get_contents(
+        $recommendation_api . '/api/cache/invalidate/' . rawurlencode($user_email),
+        false,
+        stream_context_create(['http' => ['method' => 'POST', 'timeout' => 0.5]])
+    );
+
     echo json_encode(['success' => true, 'message' => 'Activity tracked successfully']);
 } catch (Exception $e) {
     echo json_encode(['error' => 'Failed to track activity: ' . $e->getMessage()]);
 }
-?> 
\ No newline at end of file
+?>
\ No newline at end of file
@@ -0,0 +1,258 @@
+import os
+import sys
+import glob
+import time
+import uuid
+import atexit
+import threading
+from datetime import datetime, timezone
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError
+
+DEFAULT_SPILL_PATH = os.getenv(
+    'ACTIVITY_SPILL_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'activity_spill.ndjson')
+)
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MAX_PENDING = 20000
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+DUPLICATE_KEY = 11000
+
+def normalize_activity(event):
+    """Validate a tracked event and turn it into a useractivities document
+
+    Raises ValueError for events without an action or a user. The event
+    keeps the client's 'eventId' or gets a new one; its _id is only assigned
+    when it is inserted (see ActivityIngestBuffer).
+    """
+    if not isinstance(event, dict):
+        raise ValueError("Activity must be a JSON object")
+    if not event.get('action'):
+        raise ValueError("Activity is missing 'action'")
+    if not (event.get('userId') or event.get('email')):
+        raise ValueError("Activity is missing 'userId'")
+    if 'eventId' in event and not (isinstance(event['eventId'], str) and event['eventId']):
+        raise ValueError("Activity 'eventId' must be a non-empty string")
+
+    activity = dict(event)
+    metadata = activity.get('metadata')
+    activity['metadata'] = metadata if isinstance(metadata, dict) else {}
+
+    timestamp = activity.get('timestamp')
+    if isinstance(timestamp, str):
+        try:
+            timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError(f"Invalid timestamp: {timestamp}")
+    elif isinstance(timestamp, (int, float)):
+        # Milliseconds since the epoch, as sent by Date.now()
+        timestamp = datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc)
+    activity['timestamp'] = timestamp or datetime.now(timezone.utc)
+
+    # The event id is fixed on arrival and unique in useractivities, so a
+    # retried insert or a replayed spill file cannot store the event twice
+    activity.pop('_id', None)
+    activity['eventId'] = activity.get('eventId') or uuid.uuid4().hex
+    return activity
+
+class ActivityIngestBuffer:
+    """Buffered useractivities writer with backpressure and a local spill file
+
+    submit() appends accepted events to an NDJSON spill file and an in-memory
+    queue, then returns; a background thread writes the queue with insert_many
+    in batch_size chunks every flush_interval seconds, or as soon as a full
+    batch is waiting. Once max_pending events are queued (MongoDB slow or
+    down) submit() refuses new events so callers can back off.
+
+    The spill file is rotated into a segment for each flush and the segment is
+    removed only after all its events are stored, so events accepted before a
+    crash are replayed on the next start.
+
+    Each insert attempt gives its events fresh ObjectIds: readers tail
+    useractivities by _id (PreferenceAggregator), so an event written late
+    (backpressure, retries, replay) must not get an id from when it arrived.
+    Duplicates from retries are caught by the unique eventId index instead. Each process needs its own
+    spill_path (ACTIVITY_SPILL_PATH) when several workers run side by side.
+    """
+    def __init__(self, collection, batch_size=DEFAULT_BATCH_SIZE, max_pending=DEFAULT_MAX_PENDING,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, spill_path=DEFAULT_SPILL_PATH, on_flush=None):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.max_pending = max(max_pending, batch_size)
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self.on_flush = on_flush
+        self.pending = []
+        self.segments = []
+        self.segment_number = 0
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+
+        self.accepted = 0
+        self.rejected = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.total_flush_time = 0.0
+        self.max_flush_time = 0.0
+
+        os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+        self._replay_spill()
+        self.spill = open(self.spill_path, 'a', encoding='utf-8')
+
+        self.thread = threading.Thread(target=self._run, name='activity-ingest', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def _replay_spill(self):
+        """Queue events left in the spill file and segments by a previous process"""
+        segments = [path for path in glob.glob(self.spill_path + '.*') if path.rsplit('.', 1)[1].isdigit()]
+        paths = sorted(segments, key=lambda path: int(path.rsplit('.', 1)[1]))
+        if os.path.exists(self.spill_path):
+            paths.append(self.spill_path)
+        if not paths:
+            return
+
+        for path in paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        activity = json_util.loads(line)
+                    except Exception:
+                        # A torn last line from a crash mid-write
+                        print(f"Skipping unreadable spilled activity in {path}", file=sys.stderr)
+                        continue
+                    # Spilled before event ids existed: the _id assigned on arrival identifies it
+                    if 'eventId' not in activity and '_id' in activity:
+                        activity['eventId'] = str(activity.pop('_id'))
+                    self.pending.append(activity)
+
+        # Rewrite everything into one fresh spill file before dropping the old ones
+        temp_path = self.spill_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for activity in self.pending:
+                f.write(json_util.dumps(activity) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        for path in paths:
+            os.remove(path)
+        os.replace(temp_path, self.spill_path)
+        print(f"Replaying {len(self.pending)} spilled activities", file=sys.stderr)
+
+    def submit(self, activities):
+        """Queue normalized activities; returns False (nothing queued) when the buffer is full"""
+        with self.lock:
+            if len(self.pending) + len(activities) > self.max_pending:
+                self.rejected += len(activities)
+                return False
+            self.spill.write(''.join(json_util.dumps(activity) + '\n' for activity in activities))
+            self.spill.flush()
+            self.pending.extend(activities)
+            self.accepted += len(activities)
+            pending = len(self.pending)
+
+        if pending >= self.batch_size:
+            self.wakeup.set()
+        return True
+
+    def flush(self):
+        """Insert everything queued; returns the number of events stored"""
+        with self.flush_lock:
+            with self.lock:
+                batch, self.pending = self.pending, []
+                if not batch:
+                    return 0
+                # Rotate the spill file so this batch's events can be dropped as a unit
+                self.spill.close()
+                self.segment_number += 1
+                segment = f"{self.spill_path}.{self.segment_number}"
+                os.replace(self.spill_path, segment)
+                self.spill = open(self.spill_path, 'a', encoding='utf-8')
+                self.segments.append(segment)
+
+            start = time.perf_counter()
+            stored = 0
+            for offset in range(0, len(batch), self.batch_size):
+                chunk = batch[offset:offset + self.batch_size]
+                if not self._insert(chunk):
+                    self.failed_flushes += 1
+                    self.inserted += stored
+                    with self.lock:
+                        # Keep the unwritten events (and their segments) for the next flush
+                        self.pending[:0] = batch[offset:]
+                    return stored
+                stored += len(chunk)
+            elapsed = time.perf_counter() - start
+
+            # Every event of every segment so far is stored now
+            with self.lock:
+                segments, self.segments = self.segments, []
+            for path in segments:
+                os.remove(path)
+
+            self.flushes += 1
+            self.inserted += stored
+            self.total_flush_time += elapsed
+            self.max_flush_time = max(self.max_flush_time, elapsed)
+
+            if self.on_flush:
+                try:
+                    self.on_flush(batch)
+                except Exception as e:
+                    print(f"Error in activity flush callback: {e}", file=sys.stderr)
+            return stored
+
+    def _insert(self, chunk):
+        for activity in chunk:
+            activity['_id'] = ObjectId()
+        try:
+            self.collection.insert_many(chunk, ordered=False)
+            return True
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            if errors and all(error.get('code') == DUPLICATE_KEY for error in errors):
+                # Same eventId already stored by an attempt whose acknowledgement was lost
+                self.duplicates += len(errors)
+                return True
+            print(f"Error inserting {len(chunk)} activities: {errors[:1]}", file=sys.stderr)
+            return False
+        except Exception as e:
+            print(f"Error inserting {len(chunk)} activities: {e}", file=sys.stderr)
+            return False
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def close(self):
+        """Stop the flusher and try a last flush; anything unwritten stays in the spill file"""
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        self.wakeup.set()
+        self.thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+        with self.lock:
+            self.spill.close()
+
+    def stats(self):
+        with self.lock:
+            pending = len(self.pending)
+        return {
+            'pending': pending,
+            'max_pending': self.max_pending,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'inserted': self.inserted,
+            'duplicates': self.duplicates,
+            'flushes': self.flushes,
+            'failed_flushes': self.failed_flushes,
+            'avg_flush_ms': self.total_flush_time / self.flushes * 1000 if self.flushes else 0.0,
+            'max_flush_ms': self.max_flush_time * 1000
+        }
@@ -0,0 +1,121 @@
+import os
+import sys
+import gzip
+import argparse
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId, json_util
+from pymongo import ReplaceOne
+from mongodb_connection import get_database
+from preference_pipeline import USER_FIELDS, ROLLUP_STATE_ID, _user_expression
+
+ROLLUP_COLLECTION = 'activityrollups'
+DEFAULT_ROLLUP_AFTER_DAYS = int(os.getenv('ROLLUP_AFTER_DAYS', 30))
+
+def _day_start(moment):
+    return datetime(moment.year, moment.month, moment.day, tzinfo=timezone.utc)
+
+def _id_range(start, end):
+    return {'_id': {'$gte': ObjectId.from_datetime(start), '$lt': ObjectId.from_datetime(end)}}
+
+def daily_counts_pipeline(start, end):
+    """Count one day of raw activities per (user, action, product, phone name)"""
+    return [
+        {'$match': _id_range(start, end)},
+        {'$project': {
+            '_id': 0,
+            'user': _user_expression(USER_FIELDS),
+            'action': 1,
+            'productId': {'$ifNull': ['$metadata.productId', '$metadata.phoneId']},
+            'phoneName': '$metadata.phoneName'
+        }},
+        {'$group': {
+            '_id': {'user': '$user', 'action': '$action', 'productId': '$productId', 'phoneName': '$phoneName'},
+            'count': {'$sum': 1}
+        }}
+    ]
+
+def rollup_day(activities, rollups, start):
+    """Write the rollup documents of the day beginning at start; returns how many were written
+
+    The documents are recomputed from the raw events and replaced, so running
+    this again for a day whose raw events are still present is harmless.
+    """
+    day = start.strftime('%Y-%m-%d')
+    operations = []
+    for group in activities.aggregate(daily_counts_pipeline(start, start + timedelta(days=1)), allowDiskUse=True):
+        key = dict(group['_id'], day=day)
+        operations.append(ReplaceOne({'_id': key}, dict(key, _id=key, count=group['count']), upsert=True))
+    if operations:
+        rollups.bulk_write(operations, ordered=False)
+    return len(operations)
+
+def archive_day(activities, archive_dir, start):
+    """Write one day of raw activities to a gzipped NDJSON file; returns the number archived"""
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"useractivities-{start.strftime('%Y-%m-%d')}.ndjson.gz")
+    temp_path = path + '.tmp'
+    archived = 0
+    with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+        for activity in activities.find(_id_range(start, start + timedelta(days=1))).sort('_id', 1):
+            f.write(json_util.dumps(activity) + '\n')
+            archived += 1
+    if archived:
+        os.replace(temp_path, path)
+    else:
+        os.remove(temp_path)
+    return archived
+
+def compact_activities(activities, rollups, older_than_days=DEFAULT_ROLLUP_AFTER_DAYS, archive_dir=None, now=None):
+    """Fold raw activities older than older_than_days into daily rollups and delete them
+
+    Whole UTC days (by ObjectId time) are processed oldest first. For each
+    day the rollups are written, the raw events optionally archived, the day
+    recorded as compacted, and only then the raw events deleted, so the job
+    can be interrupted and rerun at any point without double counting.
+    """
+    cutoff = _day_start((now or datetime.now(timezone.utc)) - timedelta(days=older_than_days))
+    stats = {'days': 0, 'rollups': 0, 'archived': 0, 'deleted': 0}
+
+    state = rollups.find_one({'_id': ROLLUP_STATE_ID}) or {}
+    compacted_through = state.get('compacted_through')
+    if compacted_through is not None:
+        compacted_through = compacted_through.replace(tzinfo=timezone.utc)
+        # Finish deleting days an interrupted run already rolled up
+        stats['deleted'] += activities.delete_many({'_id': {'$lt': ObjectId.from_datetime(compacted_through)}}).deleted_count
+        start = compacted_through
+    else:
+        oldest = activities.find_one({}, {'_id': 1}, sort=[('_id', 1)])
+        if not oldest:
+            return stats
+        start = _day_start(oldest['_id'].generation_time)
+
+    while start < cutoff:
+        end = start + timedelta(days=1)
+        stats['rollups'] += rollup_day(activities, rollups, start)
+        if archive_dir:
+            stats['archived'] += archive_day(activities, archive_dir, start)
+        rollups.update_one({'_id': ROLLUP_STATE_ID}, {'$set': {'compacted_through': end}}, upsert=True)
+        stats['deleted'] += activities.delete_many(_id_range(start, end)).deleted_count
+        stats['days'] += 1
+        start = end
+
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description='Fold old useractivities into daily per-user rollups')
+    parser.add_argument('--days', type=int, default=DEFAULT_ROLLUP_AFTER_DAYS,
+                        help='keep raw activities of this many recent days')
+    parser.add_argument('--archive-dir', help='write the compacted raw activities here as .ndjson.gz')
+    args = parser.parse_args()
+
+    try:
+        db = get_database()
+        stats = compact_activities(db.useractivities, db[ROLLUP_COLLECTION], args.days, args.archive_dir)
+        print(f"Compacted {stats['days']} days: {stats['deleted']} activities into "
+              f"{stats['rollups']} rollups ({stats['archived']} archived)")
+    except Exception as e:
+        print(f"Error compacting activities: {e}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,14 @@
 from flask import Flask, jsonify, request, render_template_string
 from flask_cors import CORS
 from recommendation_engine import RecommendationEngine
+from recommendation_cache import RecommendationCache, watch_activity_changes
+from mongodb_connection import get_pool_metrics
+from activity_ingest import ActivityIngestBuffer, normalize_activity
+from preference_aggregator import activity_user
+from product_record import as_dict
 import os
+import time
+import threading
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -13,6 +20,48 @@ CORS(app)
 # Initialize recommendation engine
 engine = RecommendationEngine()
 
+# Cache computed recommendation lists until the user's activity changes
+cache = RecommendationCache(
+    max_entries=int(os.getenv('RECOMMENDATION_CACHE_SIZE', 1024)),
+    ttl=int(os.getenv('RECOMMENDATION_CACHE_TTL', 300))
+)
+
+def refresh_and_invalidate(user_ids):
+    """Apply new activities to the preferences, then drop the users' cached lists
+
+    Refreshing first means a list recomputed after the invalidation already
+    sees the new activity.
+    """
+    engine.refresh_preferences()
+    return sum(cache.invalidate_user(user_id) for user_id in user_ids)
+
+def refresh_periodically(interval):
+    """Apply activities stored by other writers (e.g. the Node /track route) every interval seconds"""
+    def run():
+        while True:
+            time.sleep(interval)
+            engine.refresh_preferences()
+
+    thread = threading.Thread(target=run, name='preference-refresher', daemon=True)
+    thread.start()
+    return thread
+
+watch_activity_changes(engine.activities, cache, on_change=refresh_and_invalidate)
+refresh_periodically(float(os.getenv('PREFERENCE_REFRESH_INTERVAL', 5.0)))
+
+def invalidate_flushed_users(activities):
+    """Drop cached lists of users whose buffered activities were just stored"""
+    refresh_and_invalidate({activity_user(activity) for activity in activities})
+
+# Buffer tracked activities and store them in batches
+ingest = ActivityIngestBuffer(
+    engine.activities,
+    batch_size=int(os.getenv('ACTIVITY_INGEST_BATCH', 500)),
+    max_pending=int(os.getenv('ACTIVITY_INGEST_MAX_PENDING', 20000)),
+    flush_interval=float(os.getenv('ACTIVITY_INGEST_INTERVAL', 1.0)),
+    on_flush=invalidate_flushed_users
+)
+
 # HTML template for the root page
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -110,6 +159,48 @@ HTML_TEMPLATE = """
         <p>Get user preferences based on their activity data.</p>
     </div>
     
+    <div class="endpoint">
+        <span class="method get">GET</span>
+        <code>/api/popular?n=5</code>
+        <p>Get the currently most popular products and brands (time-decayed view and click counts).</p>
+    </div>
+    
+    <div class="endpoint">
+        <span class="method post">POST</span>
+        <code>/api/activities</code>
+        <p>Track one activity or an array of activities. Events are stored in batches; a 429 response means the buffer is full and the client should retry later.</p>
+    </div>
+    
+    <div class="endpoint">
+        <span class="method get">GET</span>
+        <code>/api/activities/stats</code>
+        <p>Get activity ingestion counters (pending, rejected, flush latency).</p>
+    </div>
+    
+    <div class="endpoint">
+        <span class="method post">POST</span>
+        <code>/api/cache/invalidate/&lt;user_id&gt;</code>
+        <p>Drop cached recommendations for a user after new activity is tracked.</p>
+    </div>
+    
+    <div class="endpoint">
+        <span class="method get">GET</span>
+        <code>/api/cache/stats</code>
+        <p>Get recommendation cache size and hit/miss counters.</p>
+    </div>
+    
+    <div class="endpoint">
+        <span class="method get">GET</span>
+        <code>/api/mongodb/pool</code>
+        <p>Get MongoDB connection-pool options and event counters.</p>
+    </div>
+    
+    <div class="endpoint">
+        <span class="method get">GET</span>
+        <code>/api/preference-writes/stats</code>
+        <p>Get write-behind counters for stored user preferences (pending, coalescing ratio, flush latency).</p>
+    </div>
+    
     <h2>Example Response</h2>
     <pre>{
   "success": true,
@@ -145,14 +236,16 @@ def get_user_recommendations(user_id):
             engine.load_product_data()
             print(f"Loaded {len(engine.product_data)} products")
         
-        # Check if user activities are loaded
-        if not engine.user_activities:
-            print("User activities not loaded. Loading now...")
-            engine.load_user_activities()
-            print(f"Loaded activities for {len(engine.user_activities)} users")
+        # Cold users get the precomputed default response as is; preferences
+        # are refreshed on invalidation and by the background refresher
+        if not engine.has_preferences(user_id):
+            return app.response_class(engine.defaults.payload(), mimetype='application/json')
         
         # Generate recommendations
-        recommendations = engine.generate_recommendations(user_id)
+        recommendations = cache.get_or_compute(
+            user_id, 'all', engine.catalog_version,
+            lambda: engine.generate_recommendations(user_id)
+        )
         print(f"Generated recommendations: {recommendations}")
         
         return jsonify({
@@ -170,7 +263,10 @@ def get_user_recommendations(user_id):
 def get_content_based_recommendations(user_id):
     """Get content-based recommendations for a user"""
     try:
-        recommendations = engine.content_based_filtering(user_id)
+        recommendations = cache.get_or_compute(
+            user_id, 'content-based', engine.catalog_version,
+            lambda: engine.content_based_filtering(user_id)
+        )
         return jsonify({
             'success': True,
             'data': recommendations
@@ -185,7 +281,10 @@ def get_content_based_recommendations(user_id):
 def get_collaborative_recommendations(user_id):
     """Get collaborative recommendations for a user"""
     try:
-        recommendations = engine.collaborative_filtering(user_id)
+        recommendations = cache.get_or_compute(
+            user_id, 'collaborative', engine.catalog_version,
+            lambda: engine.collaborative_filtering(user_id)
+        )
         return jsonify({
             'success': True,
             'data': recommendations
@@ -200,7 +299,10 @@ def get_collaborative_recommendations(user_id):
 def get_hybrid_recommendations(user_id):
     """Get hybrid recommendations for a user"""
     try:
-        recommendations = engine.hybrid_recommendation(user_id)
+        recommendations = cache.get_or_compute(
+            user_id, 'hybrid', engine.catalog_version,
+            lambda: engine.hybrid_recommendation(user_id)
+        )
         return jsonify({
             'success': True,
             'data': recommendations
@@ -226,6 +328,92 @@ def get_user_preferences(user_id):
             'error': str(e)
         }), 500
 
+@app.route('/api/popular', methods=['GET'])
+def get_popular():
+    """Get the most popular products and brands"""
+    try:
+        n = request.args.get('n', 5, type=int)
+        popularity = engine.aggregator.popularity
+        return jsonify({
+            'success': True,
+            'data': {
+                'products': [as_dict(engine.product_data[product_id]) for product_id in engine.get_popular_products(n)],
+                'brands': [{'brand': brand, 'score': score} for brand, score in popularity.top_brands(n)]
+            }
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/activities', methods=['POST'])
+def track_activities():
+    """Queue one tracked activity or an array of them"""
+    events = request.get_json(silent=True)
+    events = events if isinstance(events, list) else [events]
+    try:
+        activities = [normalize_activity(event) for event in events]
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    if not ingest.submit(activities):
+        response = jsonify({
+            'success': False,
+            'error': 'Activity buffer is full, retry later'
+        })
+        response.headers['Retry-After'] = str(max(1, int(ingest.flush_interval)))
+        return response, 429
+    
+    return jsonify({
+        'success': True,
+        'data': {'accepted': len(activities)}
+    }), 202
+
+@app.route('/api/activities/stats', methods=['GET'])
+def get_activity_stats():
+    """Get activity ingestion counters"""
+    return jsonify({
+        'success': True,
+        'data': ingest.stats()
+    })
+
+@app.route('/api/cache/invalidate/<user_id>', methods=['POST'])
+def invalidate_user_cache(user_id):
+    """Drop cached recommendations after new activity for a user"""
+    removed = refresh_and_invalidate([user_id])
+    return jsonify({
+        'success': True,
+        'data': {'invalidated': removed}
+    })
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Get recommendation cache hit/miss counters"""
+    return jsonify({
+        'success': True,
+        'data': cache.stats()
+    })
+
+@app.route('/api/mongodb/pool', methods=['GET'])
+def get_mongodb_pool():
+    """Get MongoDB connection-pool metrics"""
+    return jsonify({
+        'success': True,
+        'data': get_pool_metrics()
+    })
+
+@app.route('/api/preference-writes/stats', methods=['GET'])
+def get_preference_write_stats():
+    """Get userpreferences write-behind metrics"""
+    return jsonify({
+        'success': True,
+        'data': engine.preference_writer.stats()
+    })
+
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=True) 
\ No newline at end of file
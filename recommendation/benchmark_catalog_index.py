@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+import random
+from enhanced_recommendation_engine import EnhancedRecommendationEngine
+from catalog_index import CatalogIndex
+
+class LinearScanIndex:
+    """The previous lookup strategy: one scan of the product list per call"""
+    def __init__(self, products):
+        self.products = products
+
+    def get(self, product_id):
+        return next((p for p in self.products if p['id'] == product_id), None)
+
+def load_engine():
+    """Build an engine with the bundled catalog and no MongoDB connection"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(script_dir)
+    engine = EnhancedRecommendationEngine.__new__(EnhancedRecommendationEngine)
+    engine.products = []
+    engine.user_preferences = {}
+    engine.amazon_path = os.path.join(project_root, 'Amazon', 'amazon_products.json')
+    engine.croma_path = os.path.join(project_root, 'Croma', 'croma_mobiles_2.json')
+    engine.flipkart_path = os.path.join(project_root, 'Home', 'flipkart_mobiles_2.json')
+    engine._load_products_from_json()
+    return engine
+
+def generate_activities(products, count, users=200):
+    """Generate synthetic product_view/product_click activities"""
+    rng = random.Random(42)
+    return [{
+        'userId': f"user{rng.randrange(users)}@example.com",
+        'action': rng.choice(['product_view', 'product_click']),
+        'metadata': {'productId': rng.choice(products)['id']}
+    } for _ in range(count)]
+
+def time_aggregation(engine, index, activities):
+    engine.catalog_index = index
+    engine.user_preferences = {}
+    start = time.perf_counter()
+    engine._aggregate_user_activities(activities)
+    return time.perf_counter() - start
+
+def main():
+    volumes = [int(v) for v in sys.argv[1:]] or [1000, 5000, 20000]
+    engine = load_engine()
+    products = engine.products
+
+    start = time.perf_counter()
+    index = CatalogIndex(products)
+    print(f"\nCatalog: {len(products)} products, index built in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    print(f"{'activities':>12} {'linear scan (s)':>16} {'indexed (s)':>12} {'speedup':>9}")
+    for volume in volumes:
+        activities = generate_activities(products, volume)
+        linear = time_aggregation(engine, LinearScanIndex(products), activities)
+        indexed = time_aggregation(engine, index, activities)
+        print(f"{volume:>12} {linear:>16.3f} {indexed:>12.4f} {linear / indexed:>8.0f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import sys
+import time
+import random
+from recommendation_engine import RecommendationEngine
+from catalog_columns import CatalogColumns
+from name_index import NameIndex
+
+class ScanCountingDict(dict):
+    """dict that counts full iterations over its items"""
+    scans = 0
+
+    def items(self):
+        ScanCountingDict.scans += 1
+        return super().items()
+
+def legacy_content_based(engine, user_id):
+    """Previous content_based_filtering: one Python scan of the catalog"""
+    preferences = engine.user_preferences[user_id]
+    product_scores = {}
+    for product_id, product in engine.product_data.items():
+        score = 0
+        if product.get('brand') in preferences['viewed_brands']:
+            score += preferences['viewed_brands'][product['brand']] * 2
+        if product.get('category') in preferences['viewed_categories']:
+            score += preferences['viewed_categories'][product['category']] * 1.5
+        for phone_name, count in preferences['phone_views'].items():
+            if phone_name.lower() in product.get('name', '').lower():
+                score += count * 3
+        if score > 0:
+            product_scores[product_id] = score
+    sorted_products = sorted(product_scores.items(), key=lambda x: x[1], reverse=True)
+    return [product_id for product_id, _ in sorted_products[:5]]
+
+def legacy_collaborative(engine, user_id):
+    """Previous collaborative_filtering: one Python scan of the catalog"""
+    preferences = engine.user_preferences[user_id]
+    product_scores = {}
+    for product_id, product in engine.product_data.items():
+        score = 0
+        if product_id in preferences['viewed_products']:
+            score += preferences['viewed_products'][product_id] * 2
+        if product_id in preferences['clicked_products']:
+            score += preferences['clicked_products'][product_id] * 3
+        if score > 0:
+            product_scores[product_id] = score
+    sorted_products = sorted(product_scores.items(), key=lambda x: x[1], reverse=True)
+    return [product_id for product_id, _ in sorted_products[:5]]
+
+def legacy_generate(engine, user_id):
+    """Previous generate_recommendations: hybrid re-ran both algorithms"""
+    content = legacy_content_based(engine, user_id)
+    collaborative = legacy_collaborative(engine, user_id)
+    combined_scores = {}
+    for product_id in legacy_content_based(engine, user_id):
+        combined_scores[product_id] = combined_scores.get(product_id, 0) + 0.6
+    for product_id in legacy_collaborative(engine, user_id):
+        combined_scores[product_id] = combined_scores.get(product_id, 0) + 0.4
+    sorted_products = sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)
+    return {
+        'content_based': content,
+        'collaborative': collaborative,
+        'hybrid': [product_id for product_id, _ in sorted_products[:5]]
+    }
+
+def synthetic_preferences(products, users=50):
+    """Generate user preferences that reference real catalog products"""
+    rng = random.Random(7)
+    preferences = {}
+    for i in range(users):
+        viewed = rng.sample(products, 8)
+        preferences[f"user{i}@example.com"] = {
+            'viewed_products': {p['id']: rng.randint(1, 3) for p in viewed},
+            'clicked_products': {p['id']: 1 for p in viewed[:3]},
+            'viewed_brands': {p['name'].split()[0]: rng.randint(1, 3) for p in viewed},
+            'viewed_categories': {'mobile': len(viewed)},
+            'phone_views': {' '.join(p['name'].split()[:3]): 1 for p in viewed[:4]}
+        }
+    return preferences
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    # Build an engine from the bundled catalog without touching MongoDB
+    engine = RecommendationEngine.__new__(RecommendationEngine)
+    product_data, _, _ = engine.read_product_files()
+    for product in product_data.values():
+        product['brand'] = product['name'].split()[0] if product['name'] else ''
+    engine.product_data = ScanCountingDict(product_data)
+    engine.catalog_columns = CatalogColumns(product_data.values())
+    engine.name_index = NameIndex(product['name'] for product in product_data.values())
+    engine.item_similarity = None
+    engine.user_preferences = synthetic_preferences(list(product_data.values()), users)
+
+    results = {}
+    for label, generate in [('legacy', legacy_generate), ('fused', RecommendationEngine.score_recommendations)]:
+        ScanCountingDict.scans = 0
+        start = time.perf_counter()
+        results[label] = [generate(engine, user_id) for user_id in engine.user_preferences]
+        elapsed = time.perf_counter() - start
+        print(f"{label:>7}: {elapsed / users * 1000:7.2f} ms/request, "
+              f"{ScanCountingDict.scans / users:.0f} catalog dict scans/request")
+
+    mismatches = sum(1 for old, new in zip(results['legacy'], results['fused']) if old != new)
+    print(f"Catalog: {len(product_data)} products, {users} users, {mismatches} differing results")
+
+if __name__ == "__main__":
+    main()
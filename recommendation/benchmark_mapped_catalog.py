@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+import multiprocessing
+from catalog import load_catalog, read_sources
+from catalog_columns import CatalogColumns
+from name_index import NameIndex
+
+def memory_kb():
+    """(private, proportional) memory of this process in kB, from /proc/self/smaps_rollup"""
+    fields = {}
+    with open('/proc/self/smaps_rollup', 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return fields['Private_Clean'] + fields['Private_Dirty'], fields['Pss']
+
+def parsed_worker():
+    """What each worker did before: parse the JSON files and build its own structures"""
+    product_data = {product['id']: product for product in read_sources()}
+    return (product_data, CatalogColumns(product_data.values()),
+            NameIndex(product['name'] for product in product_data.values()))
+
+def mapped_worker():
+    """Map the shared catalog file and build the views over it"""
+    catalog = load_catalog()
+    return catalog.by_id, CatalogColumns.from_mapped(catalog.mapped), NameIndex.from_mapped(catalog.mapped)
+
+def run_worker(build, results, done):
+    before, _ = memory_kb()
+    start = time.perf_counter()
+    product_data, columns, name_index = build()
+    # Touch what a request touches so mapped pages are actually faulted in
+    for product_id in list(product_data)[::50]:
+        product_data[product_id]
+    name_index.search('galaxy')
+    elapsed = time.perf_counter() - start
+    after, pss = memory_kb()
+    results.put((elapsed, after - before, pss))
+    done.wait()
+
+def measure(build, workers):
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    done = context.Event()
+    processes = [context.Process(target=run_worker, args=(build, results, done)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    measurements = [results.get() for _ in processes]
+    done.set()
+    for process in processes:
+        process.join()
+    return measurements
+
+def main():
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        print("This benchmark reads /proc/self/smaps_rollup and needs Linux")
+        sys.exit(1)
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+
+    load_catalog()  # make sure the snapshot exists before timing workers
+    print(f"{workers} workers, catalog of {len(load_catalog())} products")
+    print(f"{'':>8} {'start ms':>9} {'private MB':>11} {'PSS MB':>8}")
+    for label, build in [('parsed', parsed_worker), ('mapped', mapped_worker)]:
+        measurements = measure(build, workers)
+        elapsed = sum(m[0] for m in measurements) / workers
+        private = sum(m[1] for m in measurements) / workers
+        pss = sum(m[2] for m in measurements) / workers
+        print(f"{label:>8} {elapsed * 1000:9.1f} {private / 1024:11.2f} {pss / 1024:8.1f}")
+
+if __name__ == "__main__":
+    main()
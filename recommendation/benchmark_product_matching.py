@@ -0,0 +1,60 @@
+import re
+import sys
+import time
+from itertools import cycle, islice
+from product_matching import MATCH_SOURCES, best_matches, read_sources
+
+def scaled_listings(products, per_source):
+    """per_source listings per retailer, cycling through its real listings
+
+    Each copy gets its own model number ("... x17"), so copies land in the
+    same brand and storage blocks and are scored, but only match within a copy.
+    """
+    by_source = {}
+    for product in products:
+        by_source.setdefault(product['source'], []).append(product)
+    scaled = []
+    for source, listings in by_source.items():
+        for number, product in enumerate(islice(cycle(listings), per_source)):
+            copy = number // len(listings)
+            scaled.append(dict(product, id=f"{product['id']}-{copy}", name=f"{product['name']} x{copy}"))
+    return scaled
+
+def one_block_listings(products, per_source):
+    """per_source listings per retailer, all in one block per retailer pair
+
+    Digits are removed from the names, so no listing has a model number or
+    storage and every listing of a retailer is compatible with every listing
+    of another: the large-block path (chunked sparse products) does the work.
+    """
+    by_source = {}
+    for product in products:
+        by_source.setdefault(product['source'], []).append(product)
+    listings = []
+    for source, source_products in by_source.items():
+        for number, product in enumerate(islice(cycle(source_products), per_source)):
+            listings.append(dict(product, id=f"{product['id']}-{number}", brand='Brand', category='Mobile',
+                                 name=re.sub(r'\d+', ' ', product['name']).replace('efurbished', '')))
+    return listings
+
+def run(name, listings):
+    start = time.perf_counter()
+    matches = best_matches(listings)
+    elapsed = time.perf_counter() - start
+
+    sources = sorted({product['source'] for product in listings})
+    print(f"{name}: {len(listings)} listings ({len(listings) // len(sources)} x {len(sources)} retailers) "
+          f"matched in {elapsed:.1f}s")
+    for (source, match_source), (rows, _, _) in sorted(matches.items()):
+        print(f"  {match_source} vs {source}: {len(rows)}")
+
+def main():
+    per_source = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    per_block = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    products = list({product['id']: product for product in read_sources(MATCH_SOURCES)}.values())
+
+    run('many small blocks', scaled_listings(products, per_source))
+    run('one large block per retailer pair', one_block_listings(products, per_block))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import sys
+import json
+import tracemalloc
+from catalog import load_catalog
+from product_record import ProductRecord
+
+def scaled_copies(products, scale):
+    """Yield the catalog scale times as freshly parsed dicts with distinct ids
+
+    Each copy goes through json.loads, so strings are not shared between
+    products, just as when the scraped files are parsed.
+    """
+    encoded = json.dumps(products)
+    for copy in range(scale):
+        for product in json.loads(encoded):
+            product['id'] = f"{product['id']}-{copy}"
+            yield product
+
+def retained_bytes(build):
+    """Bytes still allocated after build() returns, plus its result"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+def main():
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    products = load_catalog().products
+
+    dict_bytes, dicts = retained_bytes(lambda: list(scaled_copies(products, scale)))
+    count = len(dicts)
+    del dicts
+    record_bytes, records = retained_bytes(
+        lambda: [ProductRecord.from_dict(product) for product in scaled_copies(products, scale)])
+    assert len(records) == count
+
+    print(f"{count} products ({len(products)} x {scale})")
+    print(f"  dicts:   {dict_bytes / 2**20:8.1f} MB  {dict_bytes / count:6.0f} bytes/product")
+    print(f"  records: {record_bytes / 2**20:8.1f} MB  {record_bytes / count:6.0f} bytes/product")
+    print(f"  saved:   {(dict_bytes - record_bytes) / count:6.0f} bytes/product "
+          f"({(1 - record_bytes / dict_bytes) * 100:.0f}%)")
+
+if __name__ == "__main__":
+    main()
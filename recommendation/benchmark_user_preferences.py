@@ -0,0 +1,113 @@
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+from recommendation_engine import RecommendationEngine
+from preference_writer import PreferenceWriteBuffer
+
+class RoundTripCollection:
+    """In-memory stand-in for a MongoDB collection that charges a fixed
+    round-trip time per query, so N+1 patterns show up as they do over a network"""
+    def __init__(self, documents, rtt):
+        self.documents = documents
+        self.by_id = {doc['id']: doc for doc in documents if 'id' in doc}
+        self.rtt = rtt
+        self.queries = 0
+
+    def _round_trip(self):
+        self.queries += 1
+        time.sleep(self.rtt)
+
+    def find_one(self, query):
+        self._round_trip()
+        return self.by_id.get(query['id'])
+
+    def find(self, query, projection=None):
+        self._round_trip()
+        if 'id' in query:
+            return [self.by_id[product_id] for product_id in query['id']['$in'] if product_id in self.by_id]
+        return [doc for doc in self.documents if doc.get('user_id') == query['user_id']]
+
+    def update_one(self, *args, **kwargs):
+        self._round_trip()
+
+    def bulk_write(self, *args, **kwargs):
+        self._round_trip()
+
+def legacy_get_user_preferences(engine, user_id):
+    """Previous get_user_preferences: one find_one per activity"""
+    user_activities = list(engine.activities.find({'user_id': user_id}))
+    preferences = {
+        'viewed_products': [],
+        'clicked_products': [],
+        'brands': {},
+        'categories': {},
+        'price_range': {'min': float('inf'), 'max': 0}
+    }
+    for activity in user_activities:
+        product_id = activity.get('product_id')
+        action = activity.get('action')
+        if product_id:
+            product = engine.products.find_one({'id': product_id})
+            if product:
+                if action == 'view':
+                    preferences['viewed_products'].append(product_id)
+                elif action == 'click':
+                    preferences['clicked_products'].append(product_id)
+                brand = product.get('brand')
+                if brand:
+                    preferences['brands'][brand] = preferences['brands'].get(brand, 0) + 1
+                price = product.get('price', 0)
+                preferences['price_range']['min'] = min(preferences['price_range']['min'], price)
+                preferences['price_range']['max'] = max(preferences['price_range']['max'], price)
+    engine.preferences_collection.update_one({'user_id': user_id}, {'$set': preferences}, upsert=True)
+    return preferences
+
+def build_engine(products, activities, rtt, in_memory):
+    engine = RecommendationEngine.__new__(RecommendationEngine)
+    engine.product_data = {product['id']: product for product in products} if in_memory else {}
+    engine.products = RoundTripCollection(products, rtt)
+    engine.activities = RoundTripCollection(activities, rtt)
+    engine.preferences_collection = RoundTripCollection([], rtt)
+    # Stored preferences are written behind the request, outside the timing
+    engine.preference_writer = PreferenceWriteBuffer(engine.preferences_collection, flush_interval=60)
+    return engine
+
+def main():
+    rtt = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.0005
+
+    # Use the bundled catalog for realistic ids, brands and prices
+    loader = RecommendationEngine.__new__(RecommendationEngine)
+    product_data, _, _ = loader.read_product_files()
+    products = list(product_data.values())
+    for product in products:
+        product['brand'] = product['name'].split()[0] if product['name'] else ''
+
+    rng = random.Random(13)
+    now = datetime.now()
+    print(f"Simulated round trip: {rtt * 1000:.2f} ms, catalog: {len(products)} products")
+    print(f"{'activities':>10} {'legacy ms':>10} {'queries':>8} {'$in ms':>8} {'queries':>8} {'memory ms':>10} {'queries':>8}")
+    for window in (10, 100, 1000, 5000):
+        viewed = rng.sample(products, min(50, len(products)))
+        activities = [{
+            'user_id': 'bench@example.com',
+            'product_id': rng.choice(viewed)['id'],
+            'action': rng.choice(('view', 'click')),
+            'timestamp': now - timedelta(minutes=i)
+        } for i in range(window)]
+
+        row = [f"{window:>10}"]
+        results = []
+        for label, in_memory, run in [('legacy', False, legacy_get_user_preferences),
+                                      ('$in', False, RecommendationEngine.get_user_preferences),
+                                      ('memory', True, RecommendationEngine.get_user_preferences)]:
+            engine = build_engine(products, activities, rtt, in_memory)
+            start = time.perf_counter()
+            results.append(run(engine, 'bench@example.com'))
+            elapsed = time.perf_counter() - start
+            queries = engine.products.queries + engine.activities.queries + engine.preferences_collection.queries
+            row.append(f"{elapsed * 1000:>{10 if label != '$in' else 8}.1f} {queries:>8}")
+        print(' '.join(row), '' if results[0] == results[1] == results[2] else '(results differ)')
+
+if __name__ == "__main__":
+    main()
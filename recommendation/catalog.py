@@ -0,0 +1,252 @@
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+import tempfile
+import numpy as np
+from catalog_index import stable_product_id
+from catalog_sync import sources_fingerprint
+from mapped_catalog import MappedCatalog, MappedProducts, write_mapped_catalog
+from product_record import ProductRecord
+from record_stream import iter_json_records
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Scraped retailer files, as (source name, path)
+DEFAULT_SOURCES = (
+    ('Amazon', os.path.join(PROJECT_ROOT, 'Amazon', 'amazon_products.json')),
+    ('Croma', os.path.join(PROJECT_ROOT, 'Croma', 'croma_mobiles_2.json')),
+    ('Flipkart', os.path.join(PROJECT_ROOT, 'Home', 'flipkart_mobiles_2.json'))
+)
+
+DEFAULT_SNAPSHOT_PATH = os.getenv(
+    'CATALOG_SNAPSHOT_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'catalog.bin')
+)
+
+# Bump when the normalization rules or the snapshot layout change; it is part
+# of the catalog version, so stale snapshots and synced products are rebuilt
+NORMALIZATION_VERSION = 1
+
+STRING_FIELDS = ('id', 'name', 'brand', 'category', 'source', 'image_url', 'product_url')
+NUMERIC_FIELDS = ('price', 'rating')
+
+# Brands as matched against name words, in priority order ("Xiaomi Redmi" is Redmi)
+BRANDS = (
+    ('redmi', 'Redmi'), ('poco', 'POCO'), ('oneplus', 'OnePlus'), ('samsung', 'SAMSUNG'),
+    ('vivo', 'vivo'), ('realme', 'realme'), ('oppo', 'OPPO'), ('iqoo', 'iQOO'),
+    ('nothing', 'Nothing'), ('cmf', 'CMF'), ('apple', 'Apple'), ('iphone', 'Apple'),
+    ('google', 'Google'), ('pixel', 'Google'), ('motorola', 'Motorola'), ('infinix', 'Infinix'),
+    ('tecno', 'Tecno'), ('itel', 'itel'), ('lava', 'Lava'), ('nokia', 'Nokia'),
+    ('lenovo', 'Lenovo'), ('micromax', 'Micromax'), ('huawei', 'Huawei'), ('honor', 'Honor'),
+    ('sony', 'Sony'), ('xiaomi', 'Xiaomi'), ('mi', 'Xiaomi'), ('lyf', 'LYF')
+)
+BRAND_NAMES = dict(BRANDS)
+
+PHONE_PATTERN = re.compile(r'\b(?:smart ?phones?|phones?|mobiles?|iphone|galaxy|pixel|[45]g|\d+\s?gb)\b')
+ACCESSORY_PATTERN = re.compile(r'\b(?:' + '|'.join([
+    'case', 'cover', 'charger', 'cable', 'headphone', 'earphone', 'earbud', 'screen guard',
+    'protector', 'tempered glass', 'power bank', 'adapter', 'stand', 'holder', 'mount',
+    'stylus', 'pouch', 'skin', 'strap', 'sticker', 'lens', 'tripod', 'selfie stick', 'gimbal',
+    'smartwatch', 'watch', 'tablet', 'hub', 'printer', 'cooler', 'coller', 'light', 'microphone',
+    'speaker', 'magnifier', 'scanner', 'trigger', 'remote', 'transmitter', 'sanitizer',
+    'sterilizer', 'screwdriver', 'landline'
+]) + r')(?:e?s)?\b')
+# Phone listings that mention the charger in the box are still phones
+BUNDLED_CHARGER = re.compile(r'\b(?:with|without)\s+(?:\w+\s+){0,2}charger\b|\bcharger in[- ]the[- ]box\b')
+
+def convert_price(price_str):
+    """Convert price string to float, handling various formats and invalid values"""
+    if not price_str or price_str == 'N/A':
+        return 0.0
+    try:
+        # Remove currency symbol and commas
+        return float(str(price_str).replace('₹', '').replace(',', '').strip() or 0)
+    except (ValueError, TypeError):
+        return 0.0
+
+def convert_rating(rating_str):
+    """Convert rating string to float; missing ratings are 0"""
+    if not rating_str or rating_str in ('N/A', 'No rating'):
+        return 0.0
+    try:
+        return float(rating_str)
+    except (ValueError, TypeError):
+        return 0.0
+
+def _name_words(name):
+    return re.findall(r'[a-z0-9]+', name.lower())
+
+def extract_brand(name):
+    """Get the canonical brand of a product name, or its first word if it is not a known brand"""
+    words = set(_name_words(name))
+    for word, brand in BRANDS:
+        if word in words:
+            return brand
+    parts = name.split()
+    return parts[0] if parts else 'Unknown'
+
+def is_mobile_phone(name):
+    """Check whether a product name is a phone rather than an accessory"""
+    name = name.lower()
+    if ACCESSORY_PATTERN.search(BUNDLED_CHARGER.sub(' ', name)):
+        return False
+    return bool(PHONE_PATTERN.search(name)) or any(word in BRAND_NAMES for word in _name_words(name))
+
+def normalize_product(source, item):
+    """Convert one scraped listing into the catalog product format"""
+    name = item.get('Product Name', '')
+    product_url = item.get('Product Link') or ''
+    return {
+        'id': stable_product_id(source, product_url, name),
+        'name': name,
+        'brand': extract_brand(name),
+        'category': 'Mobile' if is_mobile_phone(name) else 'Accessory',
+        'source': source,
+        # Amazon names the image column differently from the other retailers
+        'image_url': item.get('Image URL') or item.get('Image Link', ''),
+        'product_url': product_url,
+        'price': convert_price(item.get('Price')),
+        'rating': convert_rating(item.get('Rating'))
+    }
+
+def read_listings(sources):
+    """Stream the raw listings of every source file as (source, listing), one at a time"""
+    for source, path in sources:
+        for item in iter_json_records(path):
+            yield source, item
+
+def usable_listings(listings):
+    """Drop entries that are not listings or have no product name"""
+    for source, item in listings:
+        if isinstance(item, dict) and item.get('Product Name'):
+            yield source, item
+
+def read_sources(sources=DEFAULT_SOURCES):
+    """Stream normalized products from every source file as a generator pipeline
+
+    Reading, filtering and normalization (brand and category extraction)
+    each handle one listing at a time, so no source file is ever held in
+    memory as a whole. A listing scraped more than once is yielded each time;
+    consumers keep its first position and its last values.
+    """
+    for source, item in usable_listings(read_listings(sources)):
+        yield normalize_product(source, item)
+
+def catalog_version(files):
+    """Combine per-file hashes and the normalization rules into one catalog version"""
+    encoded = json.dumps({'files': files, 'normalization': NORMALIZATION_VERSION}, sort_keys=True)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:16]
+
+def source_stats(sources):
+    """Cheap change check: (source, path, mtime_ns, size) of each file (paths as given)"""
+    stats = []
+    for source, path in sources:
+        st = os.stat(path)
+        stats.append([source, path, st.st_mtime_ns, st.st_size])
+    return stats
+
+class Catalog:
+    """Normalized products of every retailer file, backed by the memory-mapped snapshot"""
+    def __init__(self, mapped):
+        self.mapped = mapped
+        self.files = mapped.meta['files']
+        self.version = mapped.meta['version']
+        # {id: ProductRecord} view; products are decoded from the mapping on access
+        self.by_id = MappedProducts(mapped, ProductRecord.from_dict)
+
+    def __len__(self):
+        return len(self.mapped)
+
+    @property
+    def products(self):
+        """Every product as a dict, in catalog order; decodes the whole catalog into one list
+
+        Use self.mapped.products() to go through the products one at a time.
+        """
+        return list(self.mapped.products())
+
+    def phones(self):
+        """Products that are phones with a usable price, as dicts"""
+        return [self.mapped.product(row) for row in self._phone_rows()]
+
+    def phone_records(self):
+        """Products that are phones with a usable price, as ProductRecords"""
+        return [ProductRecord.from_dict(self.mapped.product(row)) for row in self._phone_rows()]
+
+    def _phone_rows(self):
+        vocab, codes = self.mapped.vocab('category')
+        if 'Mobile' not in vocab:
+            return []
+        return np.flatnonzero((codes == vocab.index('Mobile')) & (self.mapped.column('price') > 0))
+
+def write_snapshot(path, products, files, version, stats):
+    """Write products as the memory-mapped catalog file (see mapped_catalog.py)"""
+    meta = {'normalization': NORMALIZATION_VERSION, 'version': version, 'files': files, 'stats': stats}
+    write_mapped_catalog(path, products, STRING_FIELDS, NUMERIC_FIELDS, meta)
+
+def open_snapshot(path):
+    """Map a snapshot, or None if it is missing, unreadable or from other normalization rules"""
+    try:
+        mapped = MappedCatalog(path)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Ignoring unreadable catalog snapshot {path}: {e}", file=sys.stderr)
+        return None
+    return mapped if mapped.meta.get('normalization') == NORMALIZATION_VERSION else None
+
+def load_catalog(sources=DEFAULT_SOURCES, snapshot_path=DEFAULT_SNAPSHOT_PATH):
+    """Map the normalized catalog, rebuilding its snapshot first if the source files changed
+
+    The snapshot is trusted as is when every source has the recorded mtime
+    and size, so a worker starts by mapping one file and parses nothing.
+    Otherwise the files are hashed: if the content is unchanged (e.g. only
+    touched) the snapshot is rewritten with the new stats, and if it changed
+    the files are streamed through read_sources() into a rebuilt snapshot.
+    Source paths are made absolute first, so callers passing relative and
+    absolute paths to the same files share one snapshot instead of each
+    seeing the other's as stale.
+    """
+    sources = [(source, os.path.abspath(path)) for source, path in sources]
+    stats = source_stats(sources)
+    mapped = open_snapshot(snapshot_path)
+    if mapped and mapped.meta['stats'] == stats:
+        return Catalog(mapped)
+
+    files, _ = sources_fingerprint([path for _, path in sources])
+    version = catalog_version(files)
+    if mapped and mapped.meta['version'] == version:
+        products = mapped.products
+    else:
+        products = lambda: read_sources(sources)
+        print(f"Normalizing {len(sources)} source files", file=sys.stderr)
+
+    try:
+        write_snapshot(snapshot_path, products(), files, version, stats)
+    except OSError as e:
+        print(f"Error writing catalog snapshot {snapshot_path}: {e}", file=sys.stderr)
+        # Still serve from a mapped file, just one private to this process
+        snapshot_path = os.path.join(tempfile.gettempdir(), f"pricely-catalog-{os.getpid()}.bin")
+        write_snapshot(snapshot_path, products(), files, version, stats)
+    return Catalog(MappedCatalog(snapshot_path))
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild the normalized product catalog snapshot')
+    parser.add_argument('--output', default=DEFAULT_SNAPSHOT_PATH)
+    args = parser.parse_args()
+
+    try:
+        if os.path.exists(args.output):
+            os.remove(args.output)
+        catalog = load_catalog(snapshot_path=args.output)
+        print(f"Wrote {len(catalog)} products ({len(catalog.phones())} phones), "
+              f"catalog {catalog.version}, to {args.output}")
+    except Exception as e:
+        print(f"Error building catalog snapshot: {e}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import numpy as np
+
+class CatalogColumns:
+    """Column arrays over a product catalog for vectorized scoring
+
+    Strings that repeat across products (brand, category, source) are stored
+    as integer codes into a vocabulary so per-user preference weights can be
+    gathered for the whole catalog with one array lookup.
+    """
+    def __init__(self, products):
+        products = list(products)
+        self.ids = [product['id'] for product in products]
+        self.row = {product_id: row for row, product_id in enumerate(self.ids)}
+        self.price = np.array([product.get('price', 0) or 0 for product in products], dtype=np.float32)
+        self.rating = np.array([product.get('rating', 0) or 0 for product in products], dtype=np.float32)
+        self.vocab = {}
+        self.codes = {}
+        for field in ('brand', 'category', 'source'):
+            self.vocab[field], self.codes[field] = self._encode([product.get(field, '') or '' for product in products])
+
+    @classmethod
+    def from_mapped(cls, catalog):
+        """Build the columns over a MappedCatalog without decoding its strings
+
+        Ids are decoded on demand and looked up by binary search, and the
+        vocabulary codes are the mapped arrays themselves, so workers
+        mapping the same catalog file share them.
+        """
+        columns = cls.__new__(cls)
+        columns.ids = catalog.column('id')
+        columns.row = catalog.ids
+        columns.price = catalog.column('price').astype(np.float32)
+        columns.rating = catalog.column('rating').astype(np.float32)
+        columns.vocab = {}
+        columns.codes = {}
+        for field in ('brand', 'category', 'source'):
+            columns.vocab[field], columns.codes[field] = catalog.vocab(field)
+        return columns
+
+    @staticmethod
+    def _encode(values):
+        vocab = {}
+        codes = np.fromiter((vocab.setdefault(value, len(vocab)) for value in values), dtype=np.int32, count=len(values))
+        return list(vocab), codes
+
+    def __len__(self):
+        return len(self.ids)
+
+    def weights(self, field, counts):
+        """Get counts[value of field] for every product (0 when missing)"""
+        lookup = np.array([counts.get(value, 0) for value in self.vocab[field]], dtype=np.float32)
+        if not len(lookup):
+            return np.zeros(len(self.ids), dtype=np.float32)
+        return lookup[self.codes[field]]
+
+    def scatter(self, counts):
+        """Get a per-product array with {product_id: count} placed at each product's row"""
+        values = np.zeros(len(self.ids), dtype=np.float32)
+        for product_id, count in counts.items():
+            row = self.row.get(product_id)
+            if row is not None:
+                values[row] += count
+        return values
+
+    def top_n(self, scores, n=5, mask=None):
+        """Get the ids of the n best scores, ties kept in catalog order
+
+        Only rows where mask is true are ranked; by default that is every
+        positive score. Uses argpartition so only the top rows get sorted.
+        """
+        if n <= 0:
+            return []
+        candidates = np.flatnonzero(scores > 0 if mask is None else mask)
+        if len(candidates) > n:
+            # Keep everything tied with the n-th score so stable ordering is preserved
+            kth = len(candidates) - n
+            threshold = scores[candidates][np.argpartition(scores[candidates], kth)[kth]]
+            candidates = candidates[scores[candidates] >= threshold]
+        order = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [self.ids[row] for row in order[:n]]
@@ -0,0 +1,83 @@
+import re
+import hashlib
+from collections import defaultdict
+from urllib.parse import urlsplit, parse_qs, unquote
+
+def canonical_url(url):
+    """Normalize a product URL so tracking parameters do not change it"""
+    if not url:
+        return ''
+    parts = urlsplit(url.strip())
+    query = parse_qs(parts.query)
+
+    # Amazon sponsored links wrap the real product path in a url= parameter
+    if parts.path.startswith('/sspa/click') and query.get('url'):
+        return canonical_url(f"{parts.scheme}://{parts.netloc}{unquote(query['url'][0])}")
+
+    path = parts.path.rstrip('/')
+    # Flipkart identifies the listing by its pid parameter
+    if query.get('pid'):
+        path = f"{path}?pid={query['pid'][0]}"
+    return f"{parts.netloc.lower()}{path}"
+
+class CatalogIndex:
+    """Lookup tables over a product list: id, canonical URL and brand to row"""
+    def __init__(self, products):
+        self.products = products
+        self.by_id = {}
+        self.by_url = {}
+        self.by_brand = defaultdict(list)
+
+        for row, product in enumerate(products):
+            self.by_id[product['id']] = row
+            url = canonical_url(product.get('product_url', ''))
+            if url:
+                self.by_url.setdefault(url, row)
+            self.by_brand[product.get('brand', '').lower()].append(row)
+
+    def __len__(self):
+        return len(self.products)
+
+    def __contains__(self, product_id):
+        return product_id in self.by_id
+
+    def get(self, product_id):
+        """Get a product by id, or None"""
+        row = self.by_id.get(product_id)
+        return None if row is None else self.products[row]
+
+    def get_by_url(self, url):
+        """Get a product by (non-canonical) product URL, or None"""
+        row = self.by_url.get(canonical_url(url))
+        return None if row is None else self.products[row]
+
+    def brand_products(self, brand):
+        """Get all products of a brand"""
+        return [self.products[row] for row in self.by_brand.get((brand or '').lower(), [])]
+
+SKU_PATTERNS = {
+    'amazon': re.compile(r'/dp/([A-Z0-9]{10})'),
+    'croma': re.compile(r'/p/(\d+)'),
+    'flipkart': re.compile(r'[?&]pid=([A-Z0-9]+)'),
+}
+
+def product_sku(source, url):
+    """Extract the retailer's own product identifier from a product URL"""
+    pattern = SKU_PATTERNS.get((source or '').lower())
+    if not pattern or not url:
+        return None
+    match = pattern.search(canonical_url(url))
+    return match.group(1) if match else None
+
+def stable_product_id(source, url, name=''):
+    """Get a product id that stays the same across catalog reloads
+
+    Uses the retailer SKU when the URL has one (e.g. 'croma-307888'), then the
+    canonical URL, then the product name.
+    """
+    source_key = (source or 'unknown').lower()
+    sku = product_sku(source, url)
+    if sku:
+        return f"{source_key}-{sku}"
+    basis = canonical_url(url) or ' '.join((name or '').lower().split())
+    return f"{source_key}-{hashlib.sha1(basis.encode('utf-8')).hexdigest()[:12]}"
@@ -0,0 +1,82 @@
+import os
+import json
+import hashlib
+from datetime import datetime
+from pymongo import UpdateOne
+
+SYNC_STATE_ID = 'products'
+
+def file_fingerprint(file_path):
+    """Get a content hash of a source file"""
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def sources_fingerprint(paths):
+    """Get per-file hashes and a combined catalog version for the source files"""
+    files = {os.path.basename(path): file_fingerprint(path) for path in paths}
+    combined = hashlib.sha256(json.dumps(files, sort_keys=True).encode('utf-8')).hexdigest()
+    return files, combined[:16]
+
+def product_hash(product):
+    """Get a stable hash of a normalized product document"""
+    encoded = json.dumps(product, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()
+
+def is_catalog_current(state_collection, catalog_version):
+    """Check whether the last recorded sync was for this catalog version"""
+    state = state_collection.find_one({'_id': SYNC_STATE_ID})
+    return bool(state) and state.get('version') == catalog_version
+
+def sync_catalog(products_collection, state_collection, products, catalog_version, files=None):
+    """Bulk-upsert changed products and tombstone removed ones
+
+    `products` maps product id to its normalized document. Only documents
+    whose content hash differs from the stored one are written, and products
+    missing from the catalog are flagged `deleted` rather than removed so
+    readers never see an empty collection.
+    """
+    existing = {
+        doc['id']: doc
+        for doc in products_collection.find({}, {'_id': 0, 'id': 1, '_hash': 1, 'deleted': 1})
+        if 'id' in doc
+    }
+
+    now = datetime.now()
+    operations = []
+    upserted = 0
+    for product_id, product in products.items():
+        digest = product_hash(product)
+        current = existing.get(product_id)
+        if current and current.get('_hash') == digest and not current.get('deleted'):
+            continue
+        operations.append(UpdateOne(
+            {'id': product_id},
+            {'$set': dict(product, _hash=digest, deleted=False, updated_at=now),
+             '$unset': {'deleted_at': ''}},
+            upsert=True
+        ))
+        upserted += 1
+
+    tombstoned = 0
+    for product_id, current in existing.items():
+        if product_id not in products and not current.get('deleted'):
+            operations.append(UpdateOne(
+                {'id': product_id},
+                {'$set': {'deleted': True, 'deleted_at': now}}
+            ))
+            tombstoned += 1
+
+    if operations:
+        products_collection.bulk_write(operations, ordered=False)
+
+    state_collection.update_one(
+        {'_id': SYNC_STATE_ID},
+        {'$set': {'version': catalog_version, 'files': files or {}, 'synced_at': now,
+                  'product_count': len(products)}},
+        upsert=True
+    )
+
+    return {'upserted': upserted, 'tombstoned': tombstoned, 'unchanged': len(products) - upserted}
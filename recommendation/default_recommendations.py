@@ -0,0 +1,107 @@
+import json
+from product_record import as_dict
+
+def build_default_recommendations(product_data):
+    """Build the default recommendations shown when no user preferences are available"""
+    products = list(product_data.values())
+
+    # Remove duplicates based on name and brand
+    unique_products = {}
+    for p in products:
+        key = f"{p['name']}_{p['brand']}"
+        if key not in unique_products:
+            unique_products[key] = p
+    products = list(unique_products.values())
+
+    # Content-based default: Sort by brand popularity
+    brand_counts = {}
+    for p in products:
+        brand = p['brand']
+        brand_counts[brand] = brand_counts.get(brand, 0) + 1
+
+    content_based_products = sorted(products, 
+        key=lambda x: (brand_counts.get(x['brand'], 0), -x['price']), 
+        reverse=True
+    )[:10]
+
+    # Collaborative default: Sort by price (most affordable)
+    collaborative_products = sorted(products, 
+        key=lambda x: x['price']
+    )[:10]
+
+    # Hybrid default: Sort by brand popularity and price
+    hybrid_products = sorted(products,
+        key=lambda x: (brand_counts.get(x['brand'], 0) * 0.7, -x['price'] * 0.3),
+        reverse=True
+    )[:10]
+
+    # Ensure all products have required fields
+    def validate_product(p):
+        return all(key in p for key in ['id', 'name', 'brand', 'price', 'source'])
+
+    content_based_products = [p for p in content_based_products if validate_product(p)]
+    collaborative_products = [p for p in collaborative_products if validate_product(p)]
+    hybrid_products = [p for p in hybrid_products if validate_product(p)]
+
+    # Ensure unique products across all recommendation types
+    seen_ids = set()
+    unique_content_based = []
+    unique_collaborative = []
+    unique_hybrid = []
+
+    # Process hybrid recommendations first
+    for p in hybrid_products:
+        if p['id'] not in seen_ids:
+            seen_ids.add(p['id'])
+            unique_hybrid.append(p)
+
+    # Then content-based
+    for p in content_based_products:
+        if p['id'] not in seen_ids:
+            seen_ids.add(p['id'])
+            unique_content_based.append(p)
+
+    # Finally collaborative
+    for p in collaborative_products:
+        if p['id'] not in seen_ids:
+            seen_ids.add(p['id'])
+            unique_collaborative.append(p)
+
+    return {
+        'content_based': [{
+            'product_id': p['id'],
+            'product': as_dict(p),
+            'score': 1.0,
+            'algorithm': 'content-based-default'
+        } for p in unique_content_based],
+        'collaborative': [{
+            'product_id': p['id'],
+            'product': as_dict(p),
+            'score': 1.0,
+            'algorithm': 'collaborative-default'
+        } for p in unique_collaborative],
+        'hybrid': [{
+            'product_id': p['id'],
+            'product': as_dict(p),
+            'score': 1.0,
+            'algorithm': 'hybrid-default'
+        } for p in unique_hybrid]
+    }
+
+class DefaultRecommendations:
+    """Cold-start recommendations for one catalog version, computed once
+
+    The lists and the serialized JSON response of /api/recommendations/user
+    (the only route serving them as is) are built when a catalog is loaded;
+    the engine swaps in a new instance on reload, so readers always see one
+    complete version. Treat the lists as read-only.
+    """
+    def __init__(self, product_data, catalog_version=None):
+        self.catalog_version = catalog_version
+        self.recommendations = build_default_recommendations(product_data)
+        self._payload = json.dumps({'success': True, 'data': self.recommendations},
+                                   separators=(',', ':')).encode('utf-8')
+
+    def payload(self):
+        """Get the ready-to-send JSON response body with every algorithm's list"""
+        return self._payload
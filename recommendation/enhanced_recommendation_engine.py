@@ -1,14 +1,29 @@
 import os
 import json
+import time
 import numpy as np
 from bson import ObjectId
 from pymongo import MongoClient
-from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from collections import defaultdict
 import re
+from catalog_index import CatalogIndex
+from catalog import load_catalog
+from product_record import ProductRecord
+from interaction_matrix import InteractionMatrix
+from catalog_columns import CatalogColumns
+from preference_pipeline import USER_FIELDS, load_preference_counts
+from mongodb_connection import get_mongodb_client
+from activity_rollup import ROLLUP_COLLECTION
+
+# Actions this engine reads from useractivities; users are keyed by
+# preference_pipeline.USER_FIELDS, like the activity rollups
+ACTIVITY_ACTIONS = ('product_view', 'product_click')
+# A user's preferences are reloaded on request once older than this many
+# seconds, or right away after invalidate_user
+USER_REFRESH_INTERVAL = float(os.getenv('USER_REFRESH_INTERVAL', 60))
 
 class JSONEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -16,6 +31,8 @@ class JSONEncoder(json.JSONEncoder):
             return str(obj)
         if isinstance(obj, datetime):
             return obj.isoformat()
+        if isinstance(obj, ProductRecord):
+            return obj.to_dict()
         return super().default(obj)
 
 class EnhancedRecommendationEngine:
@@ -23,137 +40,87 @@ class EnhancedRecommendationEngine:
                  croma_path='Croma/croma_mobiles_2.json', 
                  flipkart_path='Home/flipkart_mobiles_2.json'):
         self.products = []
+        self.catalog_index = CatalogIndex([])
+        self.catalog_columns = CatalogColumns([])
         self.user_preferences = {}
+        self.interactions = InteractionMatrix.from_preferences({})
+        self.loaded_at = time.monotonic()
+        self.refreshed_at = {}
+        self.stale_users = set()
         self.amazon_path = amazon_path
         self.croma_path = croma_path
         self.flipkart_path = flipkart_path
         self._load_products_from_json()
         
         # Connect to MongoDB for user activities
-        self.client = MongoClient(os.getenv('MONGODB_URI'))
+        self.client = get_mongodb_client()
         self.db = self.client.Pricely
         self._load_user_activities()
         
     def _load_products_from_json(self):
-        """Load products from JSON files instead of MongoDB"""
-        def load_json_file(file_path):
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                print(f"Error loading {file_path}: {str(e)}")
-                return []
-        
-        def convert_price(price_str):
-            try:
-                # Remove currency symbol and commas
-                if not price_str or price_str == 'N/A':
-                    return 0.0
-                price_str = price_str.replace('₹', '').replace(',', '').strip()
-                return float(price_str)
-            except:
-                return 0.0
-
-        def convert_rating(rating_str):
-            try:
-                if not rating_str or rating_str == 'N/A' or rating_str == 'No rating':
-                    return 0.0
-                return float(rating_str)
-            except:
-                return 0.0
-        
-        def extract_brand(name):
-            """Extract brand from product name"""
-            common_brands = ['Redmi', 'POCO', 'OnePlus', 'SAMSUNG', 'Samsung', 'vivo', 'VIVO', 'realme', 'OPPO', 'Oppo', 'iQOO', 'Nothing']
-            name_parts = name.split()
-            for brand in common_brands:
-                if brand.lower() in name.lower():
-                    return brand
-            return name_parts[0] if name_parts else 'Unknown'
-        
-        def is_mobile_phone(product):
-            # Check if product is a mobile phone (not an accessory)
-            name = product.get('Product Name', '').lower()
-            
-            # List of accessory keywords to exclude
-            accessory_keywords = [
-                'case', 'cover', 'charger', 'cable', 'headphone', 'earphone',
-                'screen guard', 'protector', 'tempered glass', 'battery',
-                'power bank', 'adapter', 'stand', 'holder', 'mount', 'dock',
-                'stylus', 'pen', 'memory card', 'sim card', 'pop socket',
-                'grip', 'skin', 'wrap', 'film', 'shield', 'bag', 'pouch',
-                'sleeve', 'strap', 'lanyard', 'keychain', 'ring', 'loop',
-                'p', 'pro', 'max', 'plus', 'lite', 'mini', 'ultra', 'edge'
-            ]
-            
-            # List of mobile phone keywords to include
-            phone_keywords = [
-                'smartphone', 'mobile phone', 'iphone', 'android phone',
-                '5g phone', '4g phone', 'dual sim phone', 'android mobile',
-                'smart phone', 'cellular phone', 'handset', 'device',
-                'samsung galaxy', 'oneplus', 'redmi', 'poco', 'vivo',
-                'oppo', 'realme', 'motorola', 'nokia', 'xiaomi', 'iqoo',
-                'nothing phone'
-            ]
-            
-            # Check if it's an accessory
-            if any(acc in name for acc in accessory_keywords):
-                return False
-                
-            # Check if it's a mobile phone
-            return any(phone in name for phone in phone_keywords)
-        
-        # Load products from different sources
-        amazon_products = load_json_file(self.amazon_path)
-        croma_products = load_json_file(self.croma_path)
-        flipkart_products = load_json_file(self.flipkart_path)
-        
-        print(f"Loaded Amazon products: {len(amazon_products)}")
-        print(f"Loaded Croma products: {len(croma_products)}")
-        print(f"Loaded Flipkart products: {len(flipkart_products)}")
-        
-        # Process and combine products
-        for source, products in [
-            ('Amazon', amazon_products),
-            ('Croma', croma_products),
-            ('Flipkart', flipkart_products)
-        ]:
-            for product in products:
-                if not is_mobile_phone(product):
-                    continue
-                    
-                name = product.get('Product Name', '')
-                price = convert_price(product.get('Price', '0'))
-                if price <= 0:
-                    continue
-                    
-                # Create standardized product structure
-                standardized_product = {
-                    'id': str(len(self.products) + 1),  # Generate unique ID
-                    'name': name,
-                    'brand': extract_brand(name),
-                    'price': price,
-                    'source': source,
-                    'category': 'Mobile',
-                    'rating': convert_rating(product.get('Rating', '0')),
-                    'image_url': product.get('Image URL', ''),
-                    'product_url': product.get('Product Link', '')
-                }
-                
-                self.products.append(standardized_product)
+        """Load the phones of the normalized catalog (from its snapshot when the files are unchanged)"""
+        try:
+            catalog = load_catalog([
+                ('Amazon', self.amazon_path),
+                ('Croma', self.croma_path),
+                ('Flipkart', self.flipkart_path)
+            ])
+        except Exception as e:
+            print(f"Error loading product catalog: {str(e)}")
+            return
+        
+        print(f"Loaded {len(catalog)} products from catalog {catalog.version}")
+        # Compact records internally; get_recommendations returns dicts
+        self.products = catalog.phone_records()
+        
+        # Build lookup tables once so scoring paths never scan the catalog by id
+        self.catalog_index = CatalogIndex(self.products)
+        self.catalog_columns = CatalogColumns(self.products)
         
         print(f"Processed and loaded {len(self.products)} valid products")
         if self.products:
             print("Sample product:", json.dumps(self.products[0], indent=2, cls=JSONEncoder))
         
     def _load_user_activities(self):
-        """Load user activities from MongoDB"""
-        activities = list(self.db.useractivities.find())
-        print(f"Found {len(activities)} activity documents")
+        """Load per-user preference counts from MongoDB"""
+        rows = load_preference_counts(self.db.useractivities, ACTIVITY_ACTIONS, user_fields=USER_FIELDS,
+                                      rollups=self.db[ROLLUP_COLLECTION])
+        print(f"Found {sum(row['count'] for row in rows)} preference activities in {len(rows)} groups")
+        
+        self._aggregate_user_activities(rows)
+        self.interactions = InteractionMatrix.from_preferences(self.user_preferences)
+        self.loaded_at = time.monotonic()
+        self.refreshed_at.clear()
+        
+        if rows:
+            print("Sample activity group:", json.dumps(rows[0], indent=2, cls=JSONEncoder))
+        print(f"Grouped activities for {len(self.user_preferences)} users")
+        print("User IDs:", list(self.user_preferences.keys()))
         
-        # Group activities by user
+    def refresh_user(self, user_id):
+        """Reload one user's preferences and interaction row with a pipeline restricted to that user"""
+        rows = load_preference_counts(self.db.useractivities, ACTIVITY_ACTIONS,
+                                      user_id=user_id, user_fields=USER_FIELDS,
+                                      rollups=self.db[ROLLUP_COLLECTION])
+        self.user_preferences.pop(user_id, None)
+        self._aggregate_user_activities(rows)
+        if user_id in self.user_preferences or user_id in self.interactions.user_index:
+            self.interactions.update_user(user_id, self.user_preferences.get(user_id, {}))
+        self.refreshed_at[user_id] = time.monotonic()
+        self.stale_users.discard(user_id)
+        
+    def invalidate_user(self, user_id):
+        """Mark a user's preferences stale after new activity; they are reloaded on their next request"""
+        self.stale_users.add(user_id)
+        
+    def _is_stale(self, user_id):
+        refreshed_at = self.refreshed_at.get(user_id, self.loaded_at)
+        return user_id in self.stale_users or time.monotonic() - refreshed_at > USER_REFRESH_INTERVAL
+        
+    def _aggregate_user_activities(self, activities):
+        """Group activities (or pipeline rows with a 'count') by user into preference counters"""
         for activity in activities:
-            user_id = activity.get('userId')
+            user_id = activity.get(USER_FIELDS[0])
             if not user_id:
                 continue
                 
@@ -169,38 +136,36 @@ class EnhancedRecommendationEngine:
             # Update preferences based on activity type
             action = activity.get('action', '')
             metadata = activity.get('metadata', {})
+            count = activity.get('count', 1)
             
             if action == 'product_view':
                 product_id = metadata.get('productId')
                 if product_id:
                     self.user_preferences[user_id]['viewed_products'][product_id] = \
-                        self.user_preferences[user_id]['viewed_products'].get(product_id, 0) + 1
+                        self.user_preferences[user_id]['viewed_products'].get(product_id, 0) + count
                     
                     # Track brand and category
-                    product = next((p for p in self.products if p['id'] == product_id), None)
+                    product = self.catalog_index.get(product_id)
                     if product:
                         self.user_preferences[user_id]['viewed_brands'][product['brand']] = \
-                            self.user_preferences[user_id]['viewed_brands'].get(product['brand'], 0) + 1
+                            self.user_preferences[user_id]['viewed_brands'].get(product['brand'], 0) + count
                         self.user_preferences[user_id]['viewed_categories'][product['category']] = \
-                            self.user_preferences[user_id]['viewed_categories'].get(product['category'], 0) + 1
+                            self.user_preferences[user_id]['viewed_categories'].get(product['category'], 0) + count
                         self.user_preferences[user_id]['phone_views'][product['name']] = \
-                            self.user_preferences[user_id]['phone_views'].get(product['name'], 0) + 1
+                            self.user_preferences[user_id]['phone_views'].get(product['name'], 0) + count
             
             elif action == 'product_click':
                 product_id = metadata.get('productId')
                 if product_id:
                     self.user_preferences[user_id]['clicked_products'][product_id] = \
-                        self.user_preferences[user_id]['clicked_products'].get(product_id, 0) + 1
-        
-        print(f"Retrieved {len(activities)} activities")
-        print("Sample activity structure:", json.dumps(activities[0], indent=2, cls=JSONEncoder))
-        print(f"Grouped activities for {len(self.user_preferences)} users")
-        print("User IDs:", list(self.user_preferences.keys()))
+                        self.user_preferences[user_id]['clicked_products'].get(product_id, 0) + count
         
     def get_recommendations(self, user_id, n=5):
         """Get recommendations for a user using hybrid approach"""
+        if self._is_stale(user_id):
+            self.refresh_user(user_id)
         if user_id not in self.user_preferences:
-            return self._get_default_recommendations(n)
+            return [product.to_dict() for product in self._get_default_recommendations(n)]
             
         preferences = self.user_preferences[user_id]
         print(f"\nProcessing {len(preferences['viewed_products'])} activities for user {user_id}")
@@ -262,7 +227,7 @@ class EnhancedRecommendationEngine:
                     if remaining == 0:
                         break
         
-        return final_recommendations[:n]  # Ensure we return exactly n recommendations
+        return [product.to_dict() for product in final_recommendations[:n]]  # Ensure we return exactly n recommendations
         
     def content_based_filtering(self, user_id, n=5):
         """Generate content-based recommendations"""
@@ -276,43 +241,27 @@ class EnhancedRecommendationEngine:
         clicked_products = set(preferences['clicked_products'].keys())
         excluded_products = viewed_products.union(clicked_products)
         
+        columns = self.catalog_columns
+        excluded_rows = [columns.row[product_id] for product_id in excluded_products if product_id in columns.row]
+        
         # Calculate average price of interacted products
-        interacted_prices = []
-        for product in self.products:
-            if product['id'] in excluded_products:
-                interacted_prices.append(product['price'])
-        avg_price = sum(interacted_prices) / len(interacted_prices) if interacted_prices else 0
-        
-        # Score products based on brand and category preferences
-        scored_products = []
-        for product in self.products:
-            if product['id'] in excluded_products:
-                continue
-                
-            score = 0
-            
-            # Brand preference score
-            brand_score = preferences['viewed_brands'].get(product['brand'], 0)
-            score += brand_score * 2  # Weight brand preference more heavily
-            
-            # Category preference score
-            category_score = preferences['viewed_categories'].get(product['category'], 0)
-            score += category_score
-            
-            # Price range score (prefer products within 20% of average price)
-            if avg_price > 0:
-                price_diff = abs(product['price'] - avg_price) / avg_price
-                if price_diff <= 0.2:  # Within 20% of average price
-                    score += 1
-            
-            # Rating score
-            score += product['rating']
+        avg_price = float(columns.price[excluded_rows].mean()) if excluded_rows else 0
+        
+        # Score all products at once: brand preference weighs twice the category preference
+        scores = columns.weights('brand', preferences['viewed_brands']) * 2
+        scores += columns.weights('category', preferences['viewed_categories'])
+        
+        # Price range score (prefer products within 20% of average price)
+        if avg_price > 0:
+            scores += np.abs(columns.price - avg_price) / avg_price <= 0.2
             
-            scored_products.append((score, product))
+        # Rating score
+        scores += columns.rating
         
-        # Sort by score and return top N recommendations
-        scored_products.sort(reverse=True, key=lambda x: x[0])
-        recommendations = [product for score, product in scored_products[:n]]
+        # Pick the top N products the user has not interacted with yet
+        candidates = np.ones(len(columns), dtype=bool)
+        candidates[excluded_rows] = False
+        recommendations = [self.catalog_index.get(product_id) for product_id in columns.top_n(scores, n, mask=candidates)]
         
         return recommendations if recommendations else self._get_default_recommendations(n)
         
@@ -321,43 +270,15 @@ class EnhancedRecommendationEngine:
         if len(self.user_preferences) < 2:
             return self._get_default_recommendations(n)
             
-        # Get current user's preferences
-        current_user = self.user_preferences[user_id]
-        current_viewed = set(current_user['viewed_products'].keys())
-        
-        # Find similar users
-        similar_users = []
-        for other_user_id, other_preferences in self.user_preferences.items():
-            if other_user_id == user_id:
-                continue
-                
-            # Calculate similarity based on viewed products
-            other_viewed = set(other_preferences['viewed_products'].keys())
-            common_products = current_viewed.intersection(other_viewed)
-            
-            if common_products:
-                similarity = len(common_products) / len(current_viewed.union(other_viewed))
-                similar_users.append((other_user_id, similarity))
-                
-        # Sort by similarity
-        similar_users.sort(key=lambda x: x[1], reverse=True)
-        
-        # Get recommendations from similar users
+        # Score products through the nearest users in the sparse interaction matrix
         recommendations = []
-        for other_user_id, similarity in similar_users[:3]:  # Top 3 similar users
-            other_preferences = self.user_preferences[other_user_id]
-            other_viewed = set(other_preferences['viewed_products'].keys())
-            
-            # Get products viewed by similar user but not by current user
-            new_products = other_viewed - current_viewed
-            for product_id in new_products:
-                product = next((p for p in self.products if p['id'] == product_id), None)
-                if product:
-                    recommendations.append((product, similarity))
-                    
-        # Sort by similarity and get top n
-        recommendations.sort(key=lambda x: x[1], reverse=True)
-        return [p[0] for p in recommendations[:n]]
+        for product_id, score in self.interactions.recommend(user_id, n=None, k=3):  # Top 3 similar users
+            product = self.catalog_index.get(product_id)
+            if product:
+                recommendations.append(product)
+                if len(recommendations) == n:
+                    break
+        return recommendations
         
     def _combine_recommendations(self, content_recs, collab_recs, n=5):
         """Combine content-based and collaborative recommendations"""
@@ -4,21 +4,11 @@ from datetime import datetime, timedelta
 from pymongo import MongoClient
 import os
 from dotenv import load_dotenv
+from catalog import load_catalog
 
 # Load environment variables
 load_dotenv()
 
-def convert_price(price_str):
-    """Convert price string to float, handling various formats and invalid values"""
-    if not price_str or price_str == 'N/A':
-        return 0.0
-    try:
-        # Remove currency symbol and commas
-        price_str = price_str.replace('₹', '').replace(',', '').strip()
-        return float(price_str)
-    except (ValueError, TypeError):
-        return 0.0
-
 def generate_test_activities():
     """Generate test user activities with different preferences"""
     try:
@@ -28,43 +18,7 @@ def generate_test_activities():
         db = client.get_database()
         
         # Load product data
-        product_data = {}
-        
-        # Load Amazon data
-        with open('../Amazon/amazon_products.json', 'r', encoding='utf-8') as f:
-            amazon_data = json.load(f)
-            for item in amazon_data:
-                product_id = str(len(product_data) + 1)
-                product_data[product_id] = {
-                    'id': product_id,
-                    'name': item.get('Product Name', ''),
-                    'brand': item.get('Product Name', '').split()[0],
-                    'price': convert_price(item.get('Price'))
-                }
-                
-        # Load Croma data
-        with open('../Croma/croma_mobiles_2.json', 'r', encoding='utf-8') as f:
-            croma_data = json.load(f)
-            for item in croma_data:
-                product_id = str(len(product_data) + 1)
-                product_data[product_id] = {
-                    'id': product_id,
-                    'name': item.get('Product Name', ''),
-                    'brand': item.get('Product Name', '').split()[0],
-                    'price': convert_price(item.get('Price'))
-                }
-                
-        # Load Flipkart data
-        with open('../Home/flipkart_mobiles_2.json', 'r', encoding='utf-8') as f:
-            flipkart_data = json.load(f)
-            for item in flipkart_data:
-                product_id = str(len(product_data) + 1)
-                product_data[product_id] = {
-                    'id': product_id,
-                    'name': item.get('Product Name', ''),
-                    'brand': item.get('Product Name', '').split()[0],
-                    'price': convert_price(item.get('Price'))
-                }
+        product_data = {product['id']: product for product in load_catalog().products}
                 
         # Get existing users from MongoDB
         collection = db.useractivities
@@ -0,0 +1,190 @@
+import numpy as np
+from scipy import sparse
+
+# Interaction weights per activity type
+VIEW_WEIGHT = 1.0
+CLICK_WEIGHT = 2.0
+# Replaced user rows kept beside the CSR matrices before they are rebuilt
+MAX_DELTA_USERS = 256
+# Similarities are rounded to this many decimals, so the delta and the
+# rebuilt matrices agree on ties (broken by the lower row)
+SIMILARITY_DECIMALS = 6
+
+def _row_positions(indptr, rows):
+    """(positions in indices/data of every entry of rows, entries per row) of a CSR matrix"""
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return offsets + np.arange(lengths.sum()), lengths
+
+def _item_users(transposed, items, values):
+    """(users, value products) of the item -> user rows of items, weighted by values"""
+    positions, lengths = _row_positions(transposed.indptr, items)
+    return transposed.indices[positions], transposed.data[positions] * np.repeat(values, lengths)
+
+class InteractionMatrix:
+    """Sparse user x item interaction matrix (CSR) with row-normalized copy
+
+    Neighbor search for one user reads that user's row and the item -> user
+    rows (the transposed matrix) of its items only, so its cost depends on
+    the interactions with that user's items rather than on the whole matrix.
+
+    Rows replaced by update_user are kept as a small delta next to the CSR
+    matrices, which are only rebuilt once MAX_DELTA_USERS rows have changed;
+    matrix itself does not include the delta rows.
+    """
+    def __init__(self, user_ids, item_ids, matrix):
+        self.user_ids = list(user_ids)
+        self.item_ids = list(item_ids)
+        self.user_index = {user_id: row for row, user_id in enumerate(self.user_ids)}
+        self.item_index = {item_id: col for col, item_id in enumerate(self.item_ids)}
+        self.matrix = matrix.tocsr()
+        self._normalize()
+        self._set_delta({})
+
+    def _normalize(self):
+        norms = np.sqrt(np.asarray(self.matrix.multiply(self.matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        self.normalized = sparse.diags(1.0 / norms) @ self.matrix
+        self.normalized_t = self.normalized.T.tocsr()
+
+    def _set_delta(self, delta):
+        """Use {row: (items, values, normalized values)} as the replaced rows"""
+        self.delta = delta
+        self.delta_rows = np.fromiter(sorted(delta), dtype=np.int64, count=len(delta))
+        rows = [np.full(len(items), row) for row, (items, _, _) in delta.items()]
+        self.delta_t = sparse.csr_matrix(
+            (np.concatenate([normalized for _, _, normalized in delta.values()] or [np.zeros(0, np.float32)]),
+             (np.concatenate([items for items, _, _ in delta.values()] or [np.zeros(0, np.int64)]),
+              np.concatenate(rows or [np.zeros(0, np.int64)]))),
+            shape=(len(self.item_ids), len(self.user_ids))
+        )
+
+    @classmethod
+    def from_preferences(cls, user_preferences, view_weight=VIEW_WEIGHT, click_weight=CLICK_WEIGHT):
+        """Build from per-user 'viewed_products'/'clicked_products' counters"""
+        user_ids = []
+        item_index = {}
+        rows, cols, values = [], [], []
+        for user_id, preferences in user_preferences.items():
+            row = len(user_ids)
+            user_ids.append(user_id)
+            for key, weight in (('viewed_products', view_weight), ('clicked_products', click_weight)):
+                for item_id, count in preferences.get(key, {}).items():
+                    col = item_index.setdefault(item_id, len(item_index))
+                    rows.append(row)
+                    cols.append(col)
+                    values.append(weight * count)
+
+        # Duplicate (row, col) entries are summed on conversion to CSR
+        matrix = sparse.coo_matrix(
+            (np.asarray(values, dtype=np.float32), (rows, cols)),
+            shape=(len(user_ids), len(item_index))
+        )
+        return cls(user_ids, item_index, matrix)
+
+    def update_user(self, user_id, preferences, view_weight=VIEW_WEIGHT, click_weight=CLICK_WEIGHT):
+        """Replace one user's row (adding the user and any new items) from their preference counters
+
+        Only that row is normalized; the CSR matrices are left as they are
+        until the delta grows past MAX_DELTA_USERS rows.
+        """
+        row = self.user_index.get(user_id)
+        if row is None:
+            row = self.user_index[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+        cols, values = [], []
+        for key, weight in (('viewed_products', view_weight), ('clicked_products', click_weight)):
+            for item_id, count in preferences.get(key, {}).items():
+                col = self.item_index.get(item_id)
+                if col is None:
+                    col = self.item_index[item_id] = len(self.item_ids)
+                    self.item_ids.append(item_id)
+                cols.append(col)
+                values.append(weight * count)
+
+        # A product both viewed and clicked is one entry, as in the CSR matrix
+        items, inverse = np.unique(np.asarray(cols, dtype=np.int64), return_inverse=True)
+        values = np.bincount(inverse, np.asarray(values, dtype=np.float32),
+                             minlength=len(items)).astype(np.float32)
+        norm = np.sqrt((values * values).sum()) or 1.0
+        delta = dict(self.delta)
+        delta[row] = (items, values, values / norm)
+        if len(delta) > MAX_DELTA_USERS:
+            self._compact(delta)
+        else:
+            self._set_delta(delta)
+
+    def _compact(self, delta):
+        """Rebuild the CSR matrices with the delta rows folded in"""
+        old = self.matrix.tocoo()
+        keep = ~np.isin(old.row, np.fromiter(delta, dtype=np.int64, count=len(delta)))
+        self.matrix = sparse.coo_matrix(
+            (np.concatenate([old.data[keep]] + [values for _, values, _ in delta.values()]),
+             (np.concatenate([old.row[keep]] + [np.full(len(items), row) for row, (items, _, _) in delta.items()]),
+              np.concatenate([old.col[keep]] + [items for items, _, _ in delta.values()]))),
+            shape=(len(self.user_ids), len(self.item_ids))
+        ).tocsr()
+        self._normalize()
+        self._set_delta({})
+
+    def _row(self, row, normalized=False):
+        """(items, values) of one user's current row"""
+        if row in self.delta:
+            items, values, normalized_values = self.delta[row]
+            return items, normalized_values if normalized else values
+        matrix = self.normalized if normalized else self.matrix
+        if row >= matrix.shape[0]:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        return matrix.indices[start:end], matrix.data[start:end]
+
+    @property
+    def shape(self):
+        return len(self.user_ids), len(self.item_ids)
+
+    def similar_users(self, user_id, k=3):
+        """Get the k most similar users by cosine similarity as (user_id, similarity)"""
+        row = self.user_index.get(user_id)
+        if row is None:
+            return []
+
+        # Sum the item -> user rows of this user's items, weighted by the user's
+        # values: from the CSR matrix for rows not replaced since, and from the delta
+        items, values = self._row(row, normalized=True)
+        in_matrix = items < self.normalized_t.shape[0]
+        matrix_users, matrix_scores = _item_users(self.normalized_t, items[in_matrix], values[in_matrix])
+        current = ~np.isin(matrix_users, self.delta_rows)
+        delta_users, delta_scores = _item_users(self.delta_t, items, values)
+        users, inverse = np.unique(np.concatenate([matrix_users[current], delta_users]), return_inverse=True)
+        similarities = np.bincount(inverse, np.concatenate([matrix_scores[current], delta_scores]),
+                                   minlength=len(users)).round(SIMILARITY_DECIMALS)
+        mask = (users != row) & (similarities > 0)
+        neighbors = users[mask]
+        scores = similarities[mask]
+        if not len(neighbors):
+            return []
+
+        order = np.lexsort((neighbors, -scores))[:k]
+        return [(self.user_ids[neighbors[i]], float(scores[i])) for i in order]
+
+    def recommend(self, user_id, n=5, k=3):
+        """Get items interacted with by the k nearest users but not by this user
+
+        Returns (item_id, score) pairs, score being the similarity-weighted
+        interaction strength summed over neighbors.
+        """
+        neighbors = self.similar_users(user_id, k)
+        if not neighbors:
+            return []
+
+        rows = [self._row(self.user_index[other_id]) for other_id, _ in neighbors]
+        items, inverse = np.unique(np.concatenate([items for items, _ in rows]), return_inverse=True)
+        weighted = np.concatenate([values * np.float32(similarity)
+                                   for (_, values), (_, similarity) in zip(rows, neighbors)])
+        scores = np.bincount(inverse, weighted, minlength=len(items)).astype(np.float32)
+
+        keep = ~np.isin(items, self._row(self.user_index[user_id])[0]) & (scores > 0)
+        items, scores = items[keep], scores[keep]
+        order = np.argsort(-scores, kind='stable')[:n]
+        return [(self.item_ids[items[i]], float(scores[i])) for i in order]
@@ -0,0 +1,121 @@
+import os
+import sys
+import json
+import argparse
+import numpy as np
+from scipy import sparse
+from interaction_matrix import InteractionMatrix
+
+DEFAULT_TOP_K = 20
+DEFAULT_PATH = os.getenv(
+    'ITEM_SIMILARITY_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'item_similarity')
+)
+
+def build_item_neighbors(interactions, top_k=DEFAULT_TOP_K, chunk_size=1024):
+    """Compute the top-K cosine neighbors of every item from co-interactions
+
+    Returns (neighbors, scores) arrays of shape (items, top_k); rows with fewer
+    than top_k neighbors are padded with -1 / 0.
+    """
+    items = interactions.matrix.T.tocsr().astype(np.float32)
+    norms = np.sqrt(np.asarray(items.multiply(items).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    items = (sparse.diags(1.0 / norms) @ items).tocsr()
+    items_t = items.T.tocsr()
+
+    n_items = items.shape[0]
+    neighbors = np.full((n_items, top_k), -1, dtype=np.int32)
+    scores = np.zeros((n_items, top_k), dtype=np.float32)
+
+    # Multiply a block of item rows at a time to bound the size of the product
+    for start in range(0, n_items, chunk_size):
+        block = (items[start:start + chunk_size] @ items_t).tocsr()
+        for offset in range(block.shape[0]):
+            row = start + offset
+            begin, end = block.indptr[offset], block.indptr[offset + 1]
+            cols = block.indices[begin:end]
+            values = block.data[begin:end]
+            keep = cols != row
+            cols, values = cols[keep], values[keep]
+            if len(cols) > top_k:
+                top = np.argpartition(-values, top_k - 1)[:top_k]
+                cols, values = cols[top], values[top]
+            order = np.argsort(-values, kind='stable')
+            neighbors[row, :len(order)] = cols[order]
+            scores[row, :len(order)] = values[order]
+
+    return neighbors, scores
+
+def save_item_similarity(path, item_ids, neighbors, scores):
+    """Write the table as raw .npy arrays plus an item id list"""
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, 'neighbors.npy'), neighbors)
+    np.save(os.path.join(path, 'scores.npy'), scores)
+    with open(os.path.join(path, 'items.json'), 'w', encoding='utf-8') as f:
+        json.dump(list(item_ids), f)
+
+class ItemSimilarityTable:
+    """Memory-mapped top-K item neighbor table ("people who viewed this also viewed")"""
+    def __init__(self, item_ids, neighbors, scores):
+        self.item_ids = item_ids
+        self.item_index = {item_id: row for row, item_id in enumerate(item_ids)}
+        self.neighbors = neighbors
+        self.scores = scores
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        """Map a table written by save_item_similarity, or return None if missing"""
+        try:
+            with open(os.path.join(path, 'items.json'), 'r', encoding='utf-8') as f:
+                item_ids = json.load(f)
+            neighbors = np.load(os.path.join(path, 'neighbors.npy'), mmap_mode='r')
+            scores = np.load(os.path.join(path, 'scores.npy'), mmap_mode='r')
+        except FileNotFoundError:
+            return None
+        return cls(item_ids, neighbors, scores)
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    def similar_items(self, item_id):
+        """Get (item_id, score) neighbors of one item"""
+        row = self.item_index.get(item_id)
+        if row is None:
+            return []
+        return [(self.item_ids[col], float(score))
+                for col, score in zip(self.neighbors[row], self.scores[row]) if col >= 0]
+
+    def recommend(self, item_weights, n=5):
+        """Score neighbors of the given {item_id: weight} items, excluding those items
+
+        Cost is O(len(item_weights) * K), independent of the number of users.
+        """
+        scores = {}
+        for item_id, weight in item_weights.items():
+            for other_id, similarity in self.similar_items(item_id):
+                if other_id not in item_weights:
+                    scores[other_id] = scores.get(other_id, 0) + weight * similarity
+        return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:n]
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the item-item co-view similarity table')
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K)
+    parser.add_argument('--output', default=DEFAULT_PATH)
+    args = parser.parse_args()
+
+    from recommendation_engine import RecommendationEngine
+    engine = RecommendationEngine()
+    # Preferences come from the daily rollups plus the recent raw activities
+    if not engine.refresh_preferences():
+        print("Failed to load user activities", file=sys.stderr)
+        return False
+
+    interactions = InteractionMatrix.from_preferences(engine.user_preferences)
+    neighbors, scores = build_item_neighbors(interactions, top_k=args.top_k)
+    save_item_similarity(args.output, interactions.item_ids, neighbors, scores)
+    print(f"Wrote top-{args.top_k} neighbors for {len(interactions.item_ids)} items to {args.output}")
+    return True
+
+if __name__ == "__main__":
+    main()
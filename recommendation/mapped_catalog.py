@@ -0,0 +1,254 @@
+import os
+import json
+import mmap
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from collections.abc import Mapping, Sequence
+import numpy as np
+from name_index import normalize_name, ngrams
+
+MAGIC = b'PRCATMM1'
+ALIGN = 64
+
+# String columns whose distinct values get a per-column vocabulary for scoring
+VOCAB_FIELDS = ('brand', 'category', 'source')
+
+def _align(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+def write_mapped_catalog(path, products, string_fields, numeric_fields, meta):
+    """Write products and their lookup indexes as one memory-mappable file, atomically
+
+    Layout: magic, header length, JSON header, then 64-byte aligned arrays.
+    Numeric columns are float64; string columns are int32 codes into one
+    string table (int64 offsets plus a UTF-8 bytes region). The indexes are
+    the rows sorted by id, a vocabulary per VOCAB_FIELDS column, and the name
+    n-gram postings as sorted grams with offsets into one row array.
+
+    products may be any iterable, e.g. a generator streaming from the source
+    files, so the product dicts are never held together. Everything else is
+    built in memory: the distinct strings (ids, names, URLs), an id to row
+    map, the columns and the n-gram postings, so peak memory still grows with
+    the catalog (about 1 KB per product; 170 MB for 180k listings) and the
+    catalog must fit in RAM. A product whose id was already seen replaces
+    that row's values but keeps its position.
+    """
+    table = {}
+    def code(value):
+        return table.setdefault(value, len(table))
+
+    columns = {field: array('i') for field in string_fields}
+    columns.update((field, array('d')) for field in numeric_fields)
+    name_keys = array('i')
+    rows = {}
+    replaced = False
+    for product in products:
+        row = rows.setdefault(product['id'], len(rows))
+        values = [code(product[field]) for field in string_fields] + [product[field] for field in numeric_fields]
+        key = code(normalize_name(product['name']))
+        if row == len(name_keys):
+            for field, value in zip(columns, values):
+                columns[field].append(value)
+            name_keys.append(key)
+        else:
+            for field, value in zip(columns, values):
+                columns[field][row] = value
+            name_keys[row] = key
+            replaced = True
+    del rows
+
+    arrays = {field: np.frombuffer(column, dtype=np.int32 if column.typecode == 'i' else np.float64)
+              for field, column in columns.items()}
+    arrays['name_key'] = np.frombuffer(name_keys, dtype=np.int32)
+    if replaced:
+        # Drop the strings only the replaced values referred to
+        code_fields = list(string_fields) + ['name_key']
+        used = np.unique(np.concatenate([arrays[field] for field in code_fields]))
+        strings = list(table)
+        table = {strings[old]: new for new, old in enumerate(used.tolist())}
+        for field in code_fields:
+            arrays[field] = np.searchsorted(used, arrays[field]).astype(np.int32)
+    strings = list(table)
+
+    ids = arrays['id']
+    arrays['id_order'] = np.array(sorted(range(len(ids)), key=lambda row: strings[ids[row]]), dtype=np.int32)
+    arrays['id_sorted'] = ids[arrays['id_order']]
+
+    for field in VOCAB_FIELDS:
+        vocab, local = np.unique(arrays[field], return_inverse=True)
+        arrays[f'{field}_vocab'] = vocab.astype(np.int32)
+        arrays[f'{field}_local'] = local.astype(np.int32)
+
+    # Compact int32 row arrays rather than lists of int objects
+    postings = defaultdict(lambda: array('i'))
+    for row, key in enumerate(arrays['name_key'].tolist()):
+        for gram in ngrams(strings[key]):
+            postings[gram].append(row)
+    grams = sorted(postings)
+    arrays['gram'] = np.fromiter((code(gram) for gram in grams), dtype=np.int32, count=len(grams))
+    arrays['posting_offsets'] = np.cumsum([0] + [len(postings[gram]) for gram in grams], dtype=np.int64)
+    arrays['posting_rows'] = np.empty(int(arrays['posting_offsets'][-1]), dtype=np.int32)
+    for gram, start in zip(grams, arrays['posting_offsets'].tolist()):
+        rows = postings.pop(gram)
+        arrays['posting_rows'][start:start + len(rows)] = rows
+
+    encoded = [value.encode('utf-8') for value in table]
+    arrays['string_offsets'] = np.cumsum([0] + [len(value) for value in encoded], dtype=np.int64)
+    arrays['string_bytes'] = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+    # The header holds the array offsets, which depend on the header size
+    layout = {}
+    header = b''
+    while True:
+        offset = _align(len(MAGIC) + 8 + len(header))
+        for name, values in arrays.items():
+            layout[name] = [values.dtype.str, offset, len(values)]
+            offset = _align(offset + values.nbytes)
+        encoded_header = json.dumps({'rows': len(name_keys), 'string_fields': list(string_fields),
+                                     'numeric_fields': list(numeric_fields), 'arrays': layout,
+                                     'meta': meta}).encode('utf-8')
+        if len(encoded_header) == len(header):
+            break
+        header = encoded_header
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(MAGIC + len(header).to_bytes(8, 'little') + header)
+        for name, values in arrays.items():
+            f.seek(layout[name][1])
+            f.write(values.tobytes())
+        f.truncate(offset)
+    os.replace(temp_path, path)
+
+class _Strings(Sequence):
+    """Read-only sequence of strings given by codes into the string table"""
+    def __init__(self, catalog, codes):
+        self.catalog = catalog
+        self.codes = codes
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        return self.catalog.string(int(self.codes[index]))
+
+class MappedIds:
+    """Id to row lookup by binary search over the rows sorted by id"""
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.sorted_ids = _Strings(catalog, catalog.arrays['id_sorted'])
+
+    def get(self, product_id, default=None):
+        position = bisect_left(self.sorted_ids, product_id)
+        if position < len(self.sorted_ids) and self.sorted_ids[position] == product_id:
+            return int(self.catalog.arrays['id_order'][position])
+        return default
+
+    def __contains__(self, product_id):
+        return self.get(product_id) is not None
+
+class MappedPostings:
+    """Name n-gram to rows lookup by binary search over the sorted grams"""
+    def __init__(self, catalog):
+        self.grams = _Strings(catalog, catalog.arrays['gram'])
+        self.offsets = catalog.arrays['posting_offsets']
+        self.rows = catalog.arrays['posting_rows']
+
+    def __len__(self):
+        return len(self.grams)
+
+    def get(self, gram, default=None):
+        position = bisect_left(self.grams, gram)
+        if position < len(self.grams) and self.grams[position] == gram:
+            return self.rows[self.offsets[position]:self.offsets[position + 1]]
+        return default
+
+class MappedCatalog:
+    """Zero-copy view of a file written by write_mapped_catalog
+
+    Every array is an np.frombuffer view over one read-only mmap, so worker
+    processes mapping the same file share its pages through the OS page
+    cache and start without parsing anything. Strings are only decoded when
+    a product or value is asked for.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not a mapped catalog")
+        header_length = int.from_bytes(self._map[len(MAGIC):len(MAGIC) + 8], 'little')
+        start = len(MAGIC) + 8
+        header = json.loads(self._map[start:start + header_length].decode('utf-8'))
+
+        self.path = path
+        self.rows = header['rows']
+        self.meta = header['meta']
+        self.string_fields = header['string_fields']
+        self.numeric_fields = header['numeric_fields']
+        self.arrays = {
+            name: np.frombuffer(self._map, dtype=np.dtype(dtype), count=count, offset=offset)
+            for name, (dtype, offset, count) in header['arrays'].items()
+        }
+        self._offsets = self.arrays['string_offsets']
+        self._bytes = self.arrays['string_bytes']
+        self.ids = MappedIds(self)
+        self.postings = MappedPostings(self)
+
+    def __len__(self):
+        return self.rows
+
+    def string(self, code):
+        return self._bytes[self._offsets[code]:self._offsets[code + 1]].tobytes().decode('utf-8')
+
+    def column(self, field):
+        """A numeric column as an array, or a string column as a lazily decoded sequence"""
+        if field in self.numeric_fields:
+            return self.arrays[field]
+        return _Strings(self, self.arrays[field])
+
+    def vocab(self, field):
+        """(distinct values, per-row codes into them) of a VOCAB_FIELDS column"""
+        return list(_Strings(self, self.arrays[f'{field}_vocab'])), self.arrays[f'{field}_local']
+
+    def product(self, row):
+        product = {field: self.string(int(self.arrays[field][row])) for field in self.string_fields}
+        for field in self.numeric_fields:
+            product[field] = float(self.arrays[field][row])
+        return product
+
+    def products(self):
+        for row in range(self.rows):
+            yield self.product(row)
+
+class MappedProducts(Mapping):
+    """Read-only {id: product} mapping over a MappedCatalog; products are decoded on access
+
+    Products are dicts, or whatever factory builds from each decoded dict.
+    """
+    def __init__(self, catalog, factory=None):
+        self.catalog = catalog
+        self.factory = factory
+
+    def _build(self, product):
+        return product if self.factory is None else self.factory(product)
+
+    def __getitem__(self, product_id):
+        row = self.catalog.ids.get(product_id)
+        if row is None:
+            raise KeyError(product_id)
+        return self._build(self.catalog.product(row))
+
+    def __contains__(self, product_id):
+        return product_id in self.catalog.ids
+
+    def __iter__(self):
+        return iter(self.catalog.column('id'))
+
+    def __len__(self):
+        return len(self.catalog)
+
+    def values(self):
+        return (self._build(product) for product in self.catalog.products())
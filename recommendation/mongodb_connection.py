@@ -1,21 +1,153 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, monitoring
 from dotenv import load_dotenv
 import os
 import sys
+import threading
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection-pool event counters for the shared client"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = {
+                'pools_created': 0,
+                'pools_cleared': 0,
+                'connections_created': 0,
+                'connections_closed': 0,
+                'checkouts': 0,
+                'checkout_failures': 0,
+                'checkins': 0,
+                'checked_out': 0,
+                'max_checked_out': 0
+            }
+
+    def _increment(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def pool_created(self, event):
+        self._increment('pools_created')
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._increment('pools_cleared')
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._increment('connections_created')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._increment('connections_closed')
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._increment('checkout_failures')
+
+    def connection_checked_out(self, event):
+        with self.lock:
+            self.counters['checkouts'] += 1
+            self.counters['checked_out'] += 1
+            self.counters['max_checked_out'] = max(self.counters['max_checked_out'], self.counters['checked_out'])
+
+    def connection_checked_in(self, event):
+        with self.lock:
+            self.counters['checkins'] += 1
+            self.counters['checked_out'] -= 1
+
+    def snapshot(self):
+        with self.lock:
+            counters = dict(self.counters)
+        counters['open_connections'] = counters['connections_created'] - counters['connections_closed']
+        return counters
+
+pool_metrics = PoolMetrics()
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+def get_client_options():
+    """Client options from the environment (pool size, timeouts, compression)"""
+    options = {
+        'maxPoolSize': _env_int('MONGODB_MAX_POOL_SIZE', 50),
+        'minPoolSize': _env_int('MONGODB_MIN_POOL_SIZE', 1),
+        'maxIdleTimeMS': _env_int('MONGODB_MAX_IDLE_TIME_MS', 300000),
+        'connectTimeoutMS': _env_int('MONGODB_CONNECT_TIMEOUT_MS', 5000),
+        'serverSelectionTimeoutMS': _env_int('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 5000),
+        'socketTimeoutMS': _env_int('MONGODB_SOCKET_TIMEOUT_MS', 30000),
+        'waitQueueTimeoutMS': _env_int('MONGODB_WAIT_QUEUE_TIMEOUT_MS', 2000)
+    }
+    # e.g. "zstd,snappy,zlib"; zstd and snappy need the zstandard / python-snappy packages
+    compressors = os.getenv('MONGODB_COMPRESSORS')
+    if compressors:
+        options['compressors'] = compressors
+    return options
 
 def get_mongodb_client():
-    """Get MongoDB client with connection from environment variables"""
-    load_dotenv()
-    mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/Pricely')
-    
-    try:
-        client = MongoClient(mongodb_uri)
-        # Test the connection
-        client.admin.command('ping')
-        return client
-    except Exception as e:
-        print(f"Error connecting to MongoDB: {str(e)}", file=sys.stderr)
-        raise
+    """Get the process-wide MongoDB client, creating it on first use
+
+    The client owns a connection pool and is safe to share between threads,
+    so every collection accessor reuses it instead of connecting per call.
+    A forked worker gets its own client, since pools cannot cross a fork.
+    """
+    global _client, _client_pid
+    if _client is not None and _client_pid == os.getpid():
+        return _client
+
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            return _client
+
+        load_dotenv()
+        mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/Pricely')
+
+        client = None
+        try:
+            client = MongoClient(mongodb_uri, event_listeners=[pool_metrics], **get_client_options())
+            # Test the connection once, when the pool is created
+            client.admin.command('ping')
+        except Exception as e:
+            print(f"Error connecting to MongoDB: {str(e)}", file=sys.stderr)
+            if client is not None:
+                client.close()
+            raise
+
+        _client = client
+        _client_pid = os.getpid()
+        return _client
+
+def close_mongodb_client():
+    """Close the shared client; the next accessor call creates a new one"""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+def get_pool_metrics():
+    """Get connection-pool counters and the options the shared client uses"""
+    return {
+        'connected': _client is not None and _client_pid == os.getpid(),
+        'options': get_client_options(),
+        'events': pool_metrics.snapshot()
+    }
 
 def get_database():
     """Get the Pricely database"""
@@ -25,4 +157,4 @@ def get_database():
 def get_collection(collection_name):
     """Get a specific collection from the database"""
     db = get_database()
-    return db[collection_name] 
\ No newline at end of file
+    return db[collection_name]
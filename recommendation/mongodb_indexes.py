@@ -0,0 +1,277 @@
+import sys
+import argparse
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+from mongodb_connection import get_database
+from preference_aggregator import PREFERENCE_ACTIONS
+from preference_pipeline import (preference_counts_pipeline, activity_totals_pipeline, rollup_counts_pipeline,
+                                 rollup_totals_pipeline)
+
+# Compound indexes the engine and the activity tracker rely on, per collection
+INDEXES = {
+    'useractivities': [
+        # get_user_preferences: {user_id, timestamp >= 30 days ago}
+        IndexModel([('user_id', ASCENDING), ('timestamp', DESCENDING)], name='user_id_timestamp'),
+        # activity tracker: {userId, isActive[, sessionId]} sorted by timestamp; distinct('userId')
+        IndexModel([('userId', ASCENDING), ('isActive', ASCENDING), ('timestamp', DESCENDING)],
+                   name='userId_isActive_timestamp'),
+        # single-user preference pipelines match either user field plus the action
+        IndexModel([('userId', ASCENDING), ('action', ASCENDING)], name='userId_action'),
+        IndexModel([('email', ASCENDING), ('action', ASCENDING)], name='email_action'),
+        # preference bootstrap: {action in [...], _id <= high-water mark}
+        IndexModel([('action', ASCENDING), ('_id', ASCENDING)], name='action_id'),
+        # activity ingestion: a retried or replayed event is stored once; other writers set no eventId
+        IndexModel([('eventId', ASCENDING)], name='eventId_unique', unique=True,
+                   partialFilterExpression={'eventId': {'$exists': True}})
+    ],
+    'activityrollups': [
+        # preference loaders: {action in [...], productId != null[, user]}; totals by user
+        IndexModel([('user', ASCENDING), ('action', ASCENDING)], name='user_action'),
+        IndexModel([('action', ASCENDING), ('productId', ASCENDING)], name='action_productId'),
+        # activity totals: the rollup documents of days before the compaction watermark
+        IndexModel([('day', ASCENDING)], name='day')
+    ],
+    'products': [
+        IndexModel([('id', ASCENDING)], name='id_unique', unique=True)
+    ],
+    'userpreferences': [
+        IndexModel([('user_id', ASCENDING)], name='user_id_unique', unique=True)
+    ]
+}
+
+def duplicate_keys(collection, keys):
+    """Find the values of keys shared by more than one document
+
+    Returns (duplicates, missing): duplicates is a list of (key values, ids
+    newest first); missing counts documents without any of the keys, which
+    a unique index also treats as one duplicate value and which are never
+    removed automatically.
+    """
+    pipeline = [
+        {'$sort': {'_id': -1}},
+        {'$group': {'_id': {key: f"${key}" for key in keys}, 'ids': {'$push': '$_id'}}},
+        {'$match': {'ids.1': {'$exists': True}}}
+    ]
+    duplicates = []
+    missing = 0
+    for group in collection.aggregate(pipeline, allowDiskUse=True):
+        if all(group['_id'].get(key) is None for key in keys):
+            missing = len(group['ids'])
+        else:
+            duplicates.append((group['_id'], group['ids']))
+    return duplicates, missing
+
+def remove_duplicate_keys(db=None, apply=False):
+    """Report, and with apply delete, all but the newest document per key of each unique index
+
+    A dry run by default: nothing is deleted unless apply is true. Returns
+    {collection: (duplicate key values, documents to delete, documents without the key)}.
+    """
+    db = db if db is not None else get_database()
+    report = {}
+    for collection_name, models in INDEXES.items():
+        for model in models:
+            if not model.document.get('unique'):
+                continue
+            collection = db[collection_name]
+            duplicates, missing = duplicate_keys(collection, list(model.document['key']))
+            if 'partialFilterExpression' in model.document:
+                # Documents without the key are not in a partial index
+                missing = 0
+            extra = [object_id for _, ids in duplicates for object_id in ids[1:]]
+            if apply and extra:
+                deleted = collection.delete_many({'_id': {'$in': extra}}).deleted_count
+                print(f"Deleted {deleted} duplicate documents from {collection_name}")
+            report[collection_name] = (len(duplicates), len(extra), missing)
+    return report
+
+def ensure_indexes(db=None):
+    """Create any declared index that does not exist yet; returns {collection: [created names]}
+
+    Indexes that already exist with the same key are left alone, so this is
+    safe to run on every startup. Nothing is ever deleted: a unique index
+    blocked by duplicate keys fails with a pointer to the explicit
+    `--dedupe` step. A collection or index that cannot be created (also
+    e.g. an existing index with the same name but a different key, which
+    needs a manual migration) does not stop the others; the failures are
+    raised together at the end.
+    """
+    db = db if db is not None else get_database()
+    created = {}
+    failures = []
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        try:
+            existing = collection.index_information()
+            missing = []
+            for model in models:
+                spec = model.document
+                current = existing.get(spec['name'])
+                if current is None:
+                    missing.append(model)
+                elif list(current['key']) != list(spec['key'].items()):
+                    raise RuntimeError(
+                        f"Index {collection_name}.{spec['name']} exists with key {current['key']}, "
+                        f"expected {list(spec['key'].items())}"
+                    )
+        except Exception as e:
+            failures.append(f"{collection_name}: {e}")
+            continue
+        for model in missing:
+            name = model.document['name']
+            try:
+                created.setdefault(collection_name, []).extend(collection.create_indexes([model]))
+                print(f"Created index {collection_name}.{name}")
+            except OperationFailure as e:
+                if e.code != 11000:
+                    failures.append(f"{collection_name}.{name}: {e}")
+                    continue
+                failures.append(f"{collection_name}.{name}: duplicate keys block this unique index ({e}); "
+                                f"review them with `python mongodb_indexes.py --dedupe`")
+            except Exception as e:
+                failures.append(f"{collection_name}.{name}: {e}")
+
+    if failures:
+        raise RuntimeError("Could not create indexes:\n  " + "\n  ".join(failures))
+    return created
+
+def query_plan_commands(user_id='index-check@example.com'):
+    """The engine's and tracker's real queries as (description, collection, explain command) tuples"""
+    since = datetime.now() - timedelta(days=30)
+    high_water_mark = ObjectId()
+    # Raw activities are read from the compaction watermark on, rollups before it
+    watermark = ObjectId.from_datetime(since)
+    before_day = since.strftime('%Y-%m-%d')
+    history = {'_id': {'$lte': high_water_mark, '$gte': watermark}}
+    return [
+        ('get_user_preferences activity window', 'useractivities', {
+            'find': 'useractivities',
+            'filter': {'user_id': user_id, 'timestamp': {'$gte': since}},
+            'projection': {'_id': 0, 'product_id': 1, 'action': 1}
+        }),
+        ('activity tracker active session', 'useractivities', {
+            'find': 'useractivities',
+            'filter': {'userId': user_id, 'isActive': True},
+            'sort': {'timestamp': -1},
+            'limit': 1
+        }),
+        ('activity tracker session lookup', 'useractivities', {
+            'find': 'useractivities',
+            'filter': {'userId': user_id, 'sessionId': 'session', 'isActive': True}
+        }),
+        ('distinct activity users', 'useractivities', {
+            'distinct': 'useractivities',
+            'key': 'userId',
+            'query': {}
+        }),
+        ('preference refresh since high-water mark', 'useractivities', {
+            'find': 'useractivities',
+            'filter': {'_id': {'$gt': high_water_mark}},
+            'sort': {'_id': 1}
+        }),
+        ('preference bootstrap counts', 'useractivities', {
+            'aggregate': 'useractivities',
+            'pipeline': preference_counts_pipeline(PREFERENCE_ACTIONS, match=history),
+            'cursor': {}
+        }),
+        ('preference bootstrap totals', 'useractivities', {
+            'aggregate': 'useractivities',
+            'pipeline': activity_totals_pipeline(match=history),
+            'cursor': {}
+        }),
+        ('single-user preference counts', 'useractivities', {
+            'aggregate': 'useractivities',
+            'pipeline': preference_counts_pipeline(PREFERENCE_ACTIONS, user_id=user_id,
+                                                   match={'_id': {'$gte': watermark}}),
+            'cursor': {}
+        }),
+        ('rollup preference counts', 'activityrollups', {
+            'aggregate': 'activityrollups',
+            'pipeline': rollup_counts_pipeline(PREFERENCE_ACTIONS, before_day=before_day),
+            'cursor': {}
+        }),
+        ('rollup activity totals', 'activityrollups', {
+            'aggregate': 'activityrollups',
+            'pipeline': rollup_totals_pipeline(before_day=before_day),
+            'cursor': {}
+        }),
+        ('single-user rollup counts', 'activityrollups', {
+            'aggregate': 'activityrollups',
+            'pipeline': rollup_counts_pipeline(PREFERENCE_ACTIONS, user_id=user_id, before_day=before_day),
+            'cursor': {}
+        }),
+        ('product lookup by id', 'products', {
+            'find': 'products',
+            'filter': {'id': {'$in': ['amazon-B0000000000']}},
+            'projection': {'_id': 0, 'id': 1, 'brand': 1, 'price': 1}
+        }),
+        ('store user preferences', 'userpreferences', {
+            'update': 'userpreferences',
+            'updates': [{'q': {'user_id': user_id}, 'u': {'$set': {'brands': {}}}, 'upsert': True}]
+        })
+    ]
+
+def _find_key(document, key):
+    """Yield every value stored under key anywhere in a nested explain document"""
+    if isinstance(document, dict):
+        for name, value in document.items():
+            if name == key:
+                yield value
+            else:
+                yield from _find_key(value, key)
+    elif isinstance(document, list):
+        for item in document:
+            yield from _find_key(item, key)
+
+def plan_stages(explain):
+    """Get the stage names of every winning plan in an explain result"""
+    return [stage for plan in _find_key(explain, 'winningPlan') for stage in _find_key(plan, 'stage')]
+
+def check_query_plans(db=None):
+    """Explain each real query and raise if any winning plan is a collection scan
+
+    Returns {description: [winning plan stages]} when every query uses an index.
+    """
+    db = db if db is not None else get_database()
+    plans = {}
+    failures = []
+    for description, collection_name, command in query_plan_commands():
+        explain = db.command('explain', command, verbosity='queryPlanner')
+        stages = plan_stages(explain)
+        plans[description] = stages
+        if not stages or 'COLLSCAN' in stages:
+            failures.append(f"{description} ({collection_name}): {' <- '.join(stages) or 'no winning plan'}")
+
+    if failures:
+        raise RuntimeError("Queries without a usable index:\n  " + "\n  ".join(failures))
+    return plans
+
+def main():
+    parser = argparse.ArgumentParser(description='Create the Pricely indexes and check the query plans')
+    parser.add_argument('--check-only', action='store_true', help='only explain the queries, do not create indexes')
+    parser.add_argument('--dedupe', action='store_true',
+                        help='report documents sharing a unique key (dry run) instead of creating indexes')
+    parser.add_argument('--apply', action='store_true', help='with --dedupe, delete all but the newest of each key')
+    args = parser.parse_args()
+
+    try:
+        if args.dedupe:
+            for collection_name, (keys, extra, missing) in remove_duplicate_keys(apply=args.apply).items():
+                action = 'deleted' if args.apply else 'would delete'
+                print(f"{collection_name}: {keys} duplicate keys, {action} {extra} documents; "
+                      f"{missing} documents without the key (fix manually)")
+            return
+        if not args.check_only:
+            created = ensure_indexes()
+            if not created:
+                print("All indexes already exist")
+        for description, stages in check_query_plans().items():
+            print(f"{description}: {' <- '.join(stages)}")
+    except Exception as e:
+        print(f"Index check failed: {e}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import numpy as np
+from collections import defaultdict
+
+NGRAM = 3
+QUERY_CACHE_SIZE = 4096
+
+def normalize_name(name):
+    """Lowercase a product name and collapse whitespace"""
+    return ' '.join((name or '').lower().split())
+
+def ngrams(text, n=NGRAM):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+class NameIndex:
+    """Character n-gram inverted index over product names
+
+    search(text) returns the rows whose normalized name contains the
+    normalized text. Candidates come from intersecting the posting lists of
+    the query's n-grams (rarest first) and are then confirmed with a substring
+    check, so only a handful of names are compared per query.
+    """
+    def __init__(self, names):
+        self.names = [normalize_name(name) for name in names]
+        postings = defaultdict(list)
+        for row, name in enumerate(self.names):
+            for gram in ngrams(name):
+                postings[gram].append(row)
+        self.postings = {gram: np.asarray(rows, dtype=np.int32) for gram, rows in postings.items()}
+        self._cache = {}
+
+    @classmethod
+    def from_mapped(cls, catalog):
+        """Use the normalized names and n-gram postings stored in a MappedCatalog"""
+        index = cls.__new__(cls)
+        index.names = catalog.column('name_key')
+        index.postings = catalog.postings
+        index._cache = {}
+        return index
+
+    def __len__(self):
+        return len(self.names)
+
+    def search(self, text):
+        """Get the sorted rows whose name contains text"""
+        query = normalize_name(text)
+        rows = self._cache.get(query)
+        if rows is None:
+            rows = self._search(query)
+            if len(self._cache) >= QUERY_CACHE_SIZE:
+                self._cache.clear()
+            self._cache[query] = rows
+        return rows
+
+    def _search(self, query):
+        if len(query) < NGRAM:
+            # Too short for the index; fall back to checking every name
+            candidates = range(len(self.names))
+        else:
+            lists = []
+            for gram in ngrams(query):
+                posting = self.postings.get(gram)
+                if posting is None:
+                    return np.empty(0, dtype=np.int32)
+                lists.append(posting)
+            lists.sort(key=len)
+            candidates = lists[0]
+            for posting in lists[1:]:
+                candidates = np.intersect1d(candidates, posting, assume_unique=True)
+                if not len(candidates):
+                    break
+        return np.asarray([row for row in candidates if query in self.names[row]], dtype=np.int32)
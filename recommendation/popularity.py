@@ -0,0 +1,124 @@
+import os
+import math
+import time
+from bisect import bisect_left, insort
+
+DEFAULT_HALF_LIFE = float(os.getenv('POPULARITY_HALF_LIFE_HOURS', 72)) * 3600
+DEFAULT_CAPACITY = 200
+
+# Re-base the landmark before exp() of the forward weights gets near overflow
+MAX_EXPONENT = 50
+
+class DecayedTopK:
+    """Exponentially decayed counts with an always-sorted top-capacity list
+
+    Uses forward decay: an event at time t is stored with weight
+    exp(rate * (t - landmark)), and the decayed count at query time is the
+    stored sum divided by exp(rate * (now - landmark)). Stored sums therefore
+    only ever grow and their order never changes with time, so the top
+    `capacity` keys can be kept sorted incrementally: add() is O(capacity) in
+    the worst case, top(k) is O(k), and no decay pass over all keys is needed.
+    """
+    def __init__(self, half_life=DEFAULT_HALF_LIFE, capacity=DEFAULT_CAPACITY, landmark=None):
+        self.half_life = half_life
+        self.rate = math.log(2) / half_life
+        self.capacity = capacity
+        self.landmark = time.time() if landmark is None else landmark
+        self.scores = {}
+        self.ranked = []  # ascending (stored score, key) of the top `capacity` keys
+        self.members = set()
+
+    def add(self, key, weight=1.0, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        exponent = self.rate * (timestamp - self.landmark)
+        if exponent > MAX_EXPONENT:
+            self._rebase(timestamp)
+            exponent = 0.0
+
+        old = self.scores.get(key, 0.0)
+        new = old + weight * math.exp(exponent)
+        self.scores[key] = new
+
+        if key in self.members:
+            del self.ranked[bisect_left(self.ranked, (old, key))]
+            insort(self.ranked, (new, key))
+        elif len(self.ranked) < self.capacity:
+            self.members.add(key)
+            insort(self.ranked, (new, key))
+        elif (new, key) > self.ranked[0]:
+            # Everything outside the list is at most the evicted minimum
+            _, evicted = self.ranked.pop(0)
+            self.members.discard(evicted)
+            self.members.add(key)
+            insort(self.ranked, (new, key))
+
+    def _rebase(self, landmark):
+        """Move the landmark forward; scales every stored score by the same factor"""
+        factor = math.exp(-self.rate * (landmark - self.landmark))
+        self.scores = {key: score * factor for key, score in self.scores.items()}
+        self.ranked = [(score * factor, key) for score, key in self.ranked]
+        self.landmark = landmark
+
+    def _decay(self, now):
+        return math.exp(-self.rate * ((time.time() if now is None else now) - self.landmark))
+
+    def score(self, key, now=None):
+        """Decayed count of key as of now"""
+        return self.scores.get(key, 0.0) * self._decay(now)
+
+    def top(self, k, now=None):
+        """The k keys with the highest decayed counts as (key, decayed count), best first"""
+        decay = self._decay(now)
+        return [(key, score * decay) for score, key in self.ranked[:-k - 1:-1]] if k > 0 else []
+
+    def __len__(self):
+        return len(self.scores)
+
+    def to_dict(self):
+        return {
+            'half_life': self.half_life,
+            'capacity': self.capacity,
+            'landmark': self.landmark,
+            'scores': self.scores
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        counter = cls(state['half_life'], state['capacity'], state['landmark'])
+        counter.scores = dict(state['scores'])
+        best = sorted(((score, key) for key, score in counter.scores.items()), reverse=True)[:counter.capacity]
+        counter.ranked = best[::-1]
+        counter.members = {key for _, key in best}
+        return counter
+
+class PopularityTracker:
+    """Time-decayed product and brand popularity fed from user activities"""
+    def __init__(self, half_life=DEFAULT_HALF_LIFE, capacity=DEFAULT_CAPACITY):
+        self.half_life = half_life
+        self.products = DecayedTopK(half_life, capacity)
+        self.brands = DecayedTopK(half_life, capacity)
+
+    def record(self, product_id, brand=None, weight=1.0, timestamp=None):
+        self.products.add(product_id, weight, timestamp)
+        if brand:
+            self.brands.add(brand, weight, timestamp)
+
+    def top_products(self, k=5, now=None):
+        return self.products.top(k, now)
+
+    def top_brands(self, k=5, now=None):
+        return self.brands.top(k, now)
+
+    def to_dict(self):
+        return {'products': self.products.to_dict(), 'brands': self.brands.to_dict()}
+
+    @classmethod
+    def from_dict(cls, state, half_life=DEFAULT_HALF_LIFE, capacity=DEFAULT_CAPACITY):
+        """Restore a snapshot, or None if it is missing or used another half-life or capacity"""
+        products, brands = (state or {}).get('products'), (state or {}).get('brands')
+        if not products or not brands or products['half_life'] != half_life or products['capacity'] != capacity:
+            return None
+        tracker = cls(half_life, capacity)
+        tracker.products = DecayedTopK.from_dict(products)
+        tracker.brands = DecayedTopK.from_dict(brands)
+        return tracker
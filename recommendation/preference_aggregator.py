@@ -0,0 +1,268 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+from bson import ObjectId
+from datetime import datetime, timedelta, timezone
+from preference_pipeline import load_preference_counts, load_activity_totals, load_daily_product_counts
+from popularity import PopularityTracker, DEFAULT_HALF_LIFE, DEFAULT_CAPACITY
+
+DEFAULT_STATE_PATH = os.getenv(
+    'PREFERENCE_STATE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'preference_state.json')
+)
+
+# ObjectIds from different writers within the same few seconds can be
+# committed out of order, so each refresh re-reads this window and skips
+# documents it has already applied
+OVERLAP = timedelta(seconds=5)
+
+# Actions that contribute to product preferences
+PREFERENCE_ACTIONS = ('product_click', 'phone_view')
+
+def activity_user(activity):
+    """Get the user an activity document belongs to"""
+    return activity.get('email') or activity.get('userId')
+
+def empty_preferences():
+    return {
+        'viewed_products': {},
+        'clicked_products': {},
+        'viewed_brands': {},
+        'viewed_categories': {},
+        'phone_views': {}
+    }
+
+class PreferenceAggregator:
+    """Per-user preference counters maintained incrementally from useractivities
+
+    refresh() only reads activities newer than the persisted high-water mark
+    (the last applied ObjectId), so its cost depends on the number of new
+    events rather than on the total history.
+
+    Published preferences are never changed in place: a refresh applies its
+    activities to copies of the users it touches and then swaps in a new
+    preferences dict, so readers holding the previous one (request threads
+    scoring a user) see one consistent version without taking the lock.
+    """
+    def __init__(self, collection, get_product, catalog_version=None,
+                 state_path=DEFAULT_STATE_PATH, save_interval=30, rollups=None,
+                 popularity_half_life=DEFAULT_HALF_LIFE, popularity_capacity=DEFAULT_CAPACITY):
+        self.collection = collection
+        self.rollups = rollups
+        self.popularity_half_life = popularity_half_life
+        self.popularity_capacity = popularity_capacity
+        self.get_product = get_product
+        self.catalog_version = catalog_version
+        self.state_path = state_path
+        self.save_interval = save_interval
+        self.lock = threading.Lock()
+        self.last_saved = 0
+        self.dirty = False
+        self.reset()
+        self.load_state()
+        atexit.register(self.save_state)
+
+    def reset(self):
+        self.preferences = {}
+        # Unpublished copy of preferences and the users copied into it, during a refresh
+        self.pending = None
+        self.copied = set()
+        self.activity_counts = {}
+        self.high_water_mark = None
+        self.recent_ids = set()
+        self.popularity = PopularityTracker(self.popularity_half_life, self.popularity_capacity)
+
+    def load_state(self):
+        """Restore counters and the high-water mark saved by save_state"""
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"Error loading preference state: {e}", file=sys.stderr)
+            return False
+
+        # Brand and category counts were resolved against a specific catalog
+        if state.get('catalog_version') != self.catalog_version:
+            print("Catalog changed since preference state was saved, rebuilding", file=sys.stderr)
+            return False
+
+        popularity = PopularityTracker.from_dict(state.get('popularity'), self.popularity_half_life, self.popularity_capacity)
+        if popularity is None:
+            print("Popularity settings changed since preference state was saved, rebuilding", file=sys.stderr)
+            return False
+
+        self.popularity = popularity
+        self.preferences = state.get('preferences', {})
+        self.activity_counts = state.get('activity_counts', {})
+        self.high_water_mark = ObjectId(state['high_water_mark']) if state.get('high_water_mark') else None
+        self.recent_ids = {ObjectId(oid) for oid in state.get('recent_ids', [])}
+        return True
+
+    def save_state(self):
+        """Persist counters and the high-water mark"""
+        with self.lock:
+            if not self.dirty:
+                return
+            state = {
+                'catalog_version': self.catalog_version,
+                'high_water_mark': str(self.high_water_mark) if self.high_water_mark else None,
+                'recent_ids': [str(oid) for oid in self.recent_ids],
+                'preferences': self.preferences,
+                'activity_counts': self.activity_counts,
+                'popularity': self.popularity.to_dict()
+            }
+            try:
+                os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+                temp_path = self.state_path + '.tmp'
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(state, f)
+                os.replace(temp_path, self.state_path)
+                self.dirty = False
+                self.last_saved = time.monotonic()
+            except Exception as e:
+                print(f"Error saving preference state: {e}", file=sys.stderr)
+
+    def set_catalog_version(self, catalog_version):
+        """Start over when the catalog that brands/categories come from changes"""
+        if catalog_version != self.catalog_version:
+            with self.lock:
+                self.catalog_version = catalog_version
+                self.reset()
+                self.dirty = True
+
+    def refresh(self):
+        """Apply activities newer than the high-water mark; returns how many were applied"""
+        with self.lock:
+            applied = 0
+            if self.high_water_mark is None:
+                applied = self.bootstrap()
+
+            query = {}
+            if self.high_water_mark is not None:
+                since = self.high_water_mark.generation_time - OVERLAP
+                query = {'_id': {'$gt': ObjectId.from_datetime(since)}}
+
+            for activity in self.collection.find(query).sort('_id', 1):
+                activity_id = activity['_id']
+                if activity_id in self.recent_ids:
+                    continue
+                self.apply(activity)
+                self.recent_ids.add(activity_id)
+                if self.high_water_mark is None or activity_id > self.high_water_mark:
+                    self.high_water_mark = activity_id
+                applied += 1
+            self._publish()
+
+            if applied:
+                self.dirty = True
+                # Only ids inside the overlap window can be read again
+                cutoff = self.high_water_mark.generation_time - OVERLAP
+                self.recent_ids = {oid for oid in self.recent_ids if oid.generation_time >= cutoff}
+
+        if self.dirty and time.monotonic() - self.last_saved >= self.save_interval:
+            self.save_state()
+        return applied
+
+    def _writable(self, user_id):
+        """The user's counters in the pending preferences, copied from the published ones first"""
+        if self.pending is None:
+            self.pending = dict(self.preferences)
+        if user_id not in self.copied:
+            published = self.pending.get(user_id) or empty_preferences()
+            self.pending[user_id] = {key: dict(counter) for key, counter in published.items()}
+            self.copied.add(user_id)
+        return self.pending[user_id]
+
+    def _publish(self):
+        """Swap the pending preferences in with one assignment"""
+        if self.pending is not None:
+            self.preferences = self.pending
+            self.pending = None
+            self.copied = set()
+
+    def bootstrap(self):
+        """Load the existing history with aggregation pipelines instead of raw documents
+
+        Compacted history comes from the daily rollups, the rest from the raw
+        events up to the current latest id.
+
+        Returns the number of activities covered.
+        """
+        latest = self.collection.find_one({}, {'_id': 1}, sort=[('_id', -1)])
+        # With no raw events left (all compacted), start tailing from now
+        high_water_mark = latest['_id'] if latest else ObjectId()
+        history = {'_id': {'$lte': high_water_mark}}
+
+        for row in load_preference_counts(self.collection, PREFERENCE_ACTIONS, match=history, rollups=self.rollups):
+            self.apply(row, count_activity=False)
+        # Popularity needs event times, which the counts above no longer carry
+        daily_counts = load_daily_product_counts(self.collection, PREFERENCE_ACTIONS, match=history, rollups=self.rollups)
+        for (product_id, day), count in sorted(daily_counts.items(), key=lambda item: item[0][1]):
+            timestamp = datetime.strptime(day, '%Y-%m-%d').replace(tzinfo=timezone.utc) + timedelta(hours=12)
+            self.record_popularity(product_id, count, timestamp.timestamp())
+        totals = load_activity_totals(self.collection, match=history, rollups=self.rollups)
+        for user_id, total in totals.items():
+            user_id = user_id or 'anonymous'
+            self._writable(user_id)
+            increment(self.activity_counts, user_id, total)
+
+        # Remember the ids inside the overlap window so the next refresh skips them
+        since = ObjectId.from_datetime(high_water_mark.generation_time - OVERLAP)
+        self.recent_ids = {doc['_id'] for doc in self.collection.find({'_id': {'$gt': since, '$lte': high_water_mark}}, {'_id': 1})}
+        self.high_water_mark = high_water_mark
+        self.dirty = True
+        return sum(totals.values())
+
+    def apply(self, activity, count_activity=True):
+        """Fold one activity (or a pipeline row with a 'count') into its user's pending counters
+
+        The change is visible to readers once refresh() publishes the pending preferences.
+        """
+        user_id = activity_user(activity) or 'anonymous'
+        preferences = self._writable(user_id)
+        count = activity.get('count', 1)
+        if count_activity:
+            increment(self.activity_counts, user_id, count)
+
+        metadata = activity.get('metadata') or {}
+        product_id = metadata.get('productId') or metadata.get('phoneId')
+        action = activity.get('action')
+        if not product_id or action not in PREFERENCE_ACTIONS:
+            return
+
+        # Track viewed products
+        increment(preferences['viewed_products'], product_id, count)
+
+        # Track clicked products
+        if action == 'product_click':
+            increment(preferences['clicked_products'], product_id, count)
+
+        # Track phone views
+        if action == 'phone_view' and metadata.get('phoneName'):
+            increment(preferences['phone_views'], metadata['phoneName'], count)
+
+        # Raw events also feed popularity; pipeline rows are handled by bootstrap
+        if count_activity:
+            activity_id = activity.get('_id')
+            timestamp = activity_id.generation_time.timestamp() if isinstance(activity_id, ObjectId) else None
+            self.record_popularity(product_id, count, timestamp)
+
+        # Track brands and categories if available
+        product = self.get_product(product_id)
+        if product:
+            if product.get('brand'):
+                increment(preferences['viewed_brands'], product['brand'], count)
+            if product.get('category'):
+                increment(preferences['viewed_categories'], product['category'], count)
+
+    def record_popularity(self, product_id, count=1, timestamp=None):
+        product = self.get_product(product_id)
+        self.popularity.record(product_id, product.get('brand') if product else None, count, timestamp)
+
+def increment(counter, key, amount=1):
+    counter[key] = counter.get(key, 0) + amount
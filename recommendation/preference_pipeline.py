@@ -0,0 +1,175 @@
+from bson import ObjectId
+
+USER_FIELDS = ('email', 'userId')
+# Document in the rollups collection recording how far raw activities were compacted
+ROLLUP_STATE_ID = 'state'
+
+def _user_expression(user_fields):
+    """$ifNull chain picking the first user field present on a document"""
+    expression = f"${user_fields[-1]}"
+    for field in reversed(user_fields[:-1]):
+        expression = {'$ifNull': [f"${field}", expression]}
+    return expression
+
+def _user_match(user_id, user_fields):
+    if len(user_fields) == 1:
+        return {user_fields[0]: user_id}
+    return {'$or': [{field: user_id} for field in user_fields]}
+
+def preference_counts_pipeline(actions, user_id=None, user_fields=USER_FIELDS, match=None):
+    """Build a pipeline counting (user, action, productId, phoneName) groups
+
+    Filtering and counting run inside MongoDB, so only one compact row per
+    distinct group crosses the wire instead of every raw activity.
+    """
+    first_match = {'action': {'$in': list(actions)}}
+    if user_id is not None:
+        first_match.update(_user_match(user_id, user_fields))
+    if match:
+        first_match.update(match)
+
+    return [
+        {'$match': first_match},
+        {'$project': {
+            '_id': 0,
+            'user': _user_expression(user_fields),
+            'action': 1,
+            'productId': {'$ifNull': ['$metadata.productId', '$metadata.phoneId']},
+            'phoneName': '$metadata.phoneName'
+        }},
+        {'$match': {'productId': {'$ne': None}}},
+        {'$group': {
+            '_id': {'user': '$user', 'action': '$action', 'productId': '$productId', 'phoneName': '$phoneName'},
+            'count': {'$sum': 1}
+        }}
+    ]
+
+def activity_totals_pipeline(user_id=None, user_fields=USER_FIELDS, match=None):
+    """Build a pipeline counting all activities per user"""
+    first_match = dict(match or {})
+    if user_id is not None:
+        first_match.update(_user_match(user_id, user_fields))
+    pipeline = [{'$match': first_match}] if first_match else []
+    pipeline.append({'$group': {'_id': _user_expression(user_fields), 'count': {'$sum': 1}}})
+    return pipeline
+
+def rollup_counts_pipeline(actions, user_id=None, before_day=None):
+    """Sum daily rollup documents (see activity_rollup.py) per (user, action, productId, phoneName)"""
+    first_match = {'action': {'$in': list(actions)}, 'productId': {'$ne': None}}
+    if user_id is not None:
+        first_match['user'] = user_id
+    if before_day is not None:
+        first_match['day'] = {'$lt': before_day}
+    return [
+        {'$match': first_match},
+        {'$group': {
+            '_id': {'user': '$user', 'action': '$action', 'productId': '$productId', 'phoneName': '$phoneName'},
+            'count': {'$sum': '$count'}
+        }}
+    ]
+
+def rollup_totals_pipeline(user_id=None, before_day=None):
+    """Sum daily rollup documents per user"""
+    first_match = {'day': {'$exists': True} if before_day is None else {'$lt': before_day}}
+    if user_id is not None:
+        first_match['user'] = user_id
+    return [
+        {'$match': first_match},
+        {'$group': {'_id': '$user', 'count': {'$sum': '$count'}}}
+    ]
+
+def _sum_groups(collection, pipeline, counts):
+    for group in collection.aggregate(pipeline, allowDiskUse=True):
+        key = group['_id']
+        key = tuple(sorted(key.items())) if isinstance(key, dict) else key
+        counts[key] = counts.get(key, 0) + group['count']
+
+def compacted_through(rollups):
+    """Get the start of the first day whose raw activities were not compacted, or None"""
+    state = rollups.find_one({'_id': ROLLUP_STATE_ID}) or {}
+    return state.get('compacted_through')
+
+def _split_at_watermark(match, rollups):
+    """(raw activity match, rollup day bound) so every day is read from exactly one side
+
+    Days before the compaction watermark come from the rollups only, even if
+    their raw events are still present (written to the rollups but not yet
+    deleted); later days come from the raw events only. Without a watermark
+    nothing has been compacted and the rollups are not read at all.
+    """
+    watermark = compacted_through(rollups) if rollups is not None else None
+    if watermark is None:
+        return match, None
+    match = dict(match or {})
+    match['_id'] = dict(match.get('_id', {}), **{'$gte': ObjectId.from_datetime(watermark)})
+    return match, watermark.strftime('%Y-%m-%d')
+
+def load_preference_counts(collection, actions, user_id=None, user_fields=USER_FIELDS, match=None, rollups=None):
+    """Run the preference pipeline and return activity-shaped rows with a count
+
+    Each row looks like an activity document ({user field, 'action',
+    'metadata': {'productId', 'phoneName'}}) plus 'count', so the existing
+    per-activity folding code can consume it unchanged. With a rollups
+    collection, compacted history is added to the raw events after the
+    compaction watermark.
+    """
+    counts = {}
+    match, before_day = _split_at_watermark(match, rollups)
+    _sum_groups(collection, preference_counts_pipeline(actions, user_id, user_fields, match), counts)
+    if before_day is not None:
+        _sum_groups(rollups, rollup_counts_pipeline(actions, user_id, before_day), counts)
+
+    rows = []
+    for key, count in counts.items():
+        key = dict(key)
+        metadata = {'productId': key['productId']}
+        if key.get('phoneName'):
+            metadata['phoneName'] = key['phoneName']
+        rows.append({
+            user_fields[0]: key.get('user'),
+            'action': key['action'],
+            'metadata': metadata,
+            'count': count
+        })
+    return rows
+
+def load_activity_totals(collection, user_id=None, user_fields=USER_FIELDS, match=None, rollups=None):
+    """Get {user: number of activities}; documents without a user count under None"""
+    totals = {}
+    match, before_day = _split_at_watermark(match, rollups)
+    _sum_groups(collection, activity_totals_pipeline(user_id, user_fields, match), totals)
+    if before_day is not None:
+        _sum_groups(rollups, rollup_totals_pipeline(user_id, before_day), totals)
+    return totals
+
+def daily_product_counts_pipeline(actions, match=None):
+    """Count raw activities per (productId, UTC day of the ObjectId)"""
+    first_match = {'action': {'$in': list(actions)}}
+    if match:
+        first_match.update(match)
+    return [
+        {'$match': first_match},
+        {'$project': {
+            '_id': 0,
+            'productId': {'$ifNull': ['$metadata.productId', '$metadata.phoneId']},
+            'day': {'$dateToString': {'format': '%Y-%m-%d', 'date': {'$toDate': '$_id'}}}
+        }},
+        {'$match': {'productId': {'$ne': None}}},
+        {'$group': {'_id': {'productId': '$productId', 'day': '$day'}, 'count': {'$sum': 1}}}
+    ]
+
+def rollup_daily_product_counts_pipeline(actions, before_day):
+    """Sum daily rollup documents before before_day per (productId, day)"""
+    return [
+        {'$match': {'action': {'$in': list(actions)}, 'productId': {'$ne': None}, 'day': {'$lt': before_day}}},
+        {'$group': {'_id': {'productId': '$productId', 'day': '$day'}, 'count': {'$sum': '$count'}}}
+    ]
+
+def load_daily_product_counts(collection, actions, match=None, rollups=None):
+    """Get {(productId, 'YYYY-MM-DD'): count} from raw activities and daily rollups"""
+    counts = {}
+    match, before_day = _split_at_watermark(match, rollups)
+    _sum_groups(collection, daily_product_counts_pipeline(actions, match), counts)
+    if before_day is not None:
+        _sum_groups(rollups, rollup_daily_product_counts_pipeline(actions, before_day), counts)
+    return {(dict(key)['productId'], dict(key)['day']): count for key, count in counts.items()}
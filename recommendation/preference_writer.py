@@ -0,0 +1,135 @@
+import sys
+import time
+import atexit
+import threading
+from collections import OrderedDict
+from pymongo import UpdateOne
+
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_MAX_PENDING = 2000
+DEFAULT_FLUSH_INTERVAL = 2.0
+
+class PreferenceWriteBuffer:
+    """Write-behind buffer for userpreferences upserts
+
+    submit() only records the latest preferences of a user in memory, so
+    repeated updates of the same user between flushes coalesce into one
+    write. A background thread flushes everything pending with one unordered
+    bulk_write when batch_size users are pending or every flush_interval
+    seconds. At max_pending users the submitting thread flushes inline, which
+    bounds memory when MongoDB falls behind.
+    """
+    def __init__(self, collection, batch_size=DEFAULT_BATCH_SIZE, max_pending=DEFAULT_MAX_PENDING,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, key_field='user_id'):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.max_pending = max(max_pending, batch_size)
+        self.flush_interval = flush_interval
+        self.key_field = key_field
+        self.pending = OrderedDict()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+
+        self.submitted = 0
+        self.coalesced = 0
+        self.written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+        self.total_flush_time = 0.0
+        self.max_flush_time = 0.0
+        self.last_flush_time = 0.0
+
+        self.thread = threading.Thread(target=self._run, name='preference-write-behind', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def submit(self, user_id, preferences):
+        """Queue the latest preferences of a user for writing"""
+        with self.lock:
+            if user_id in self.pending:
+                self.coalesced += 1
+                self.pending.move_to_end(user_id)
+            self.pending[user_id] = preferences
+            self.submitted += 1
+            pending = len(self.pending)
+
+        if pending >= self.max_pending:
+            self.flush()
+        elif pending >= self.batch_size:
+            self.wakeup.set()
+
+    def flush(self):
+        """Write everything pending with one unordered bulk_write; returns the number of users written"""
+        with self.flush_lock:
+            with self.lock:
+                batch, self.pending = self.pending, OrderedDict()
+            if not batch:
+                return 0
+
+            operations = [
+                UpdateOne({self.key_field: user_id}, {'$set': preferences}, upsert=True)
+                for user_id, preferences in batch.items()
+            ]
+            start = time.perf_counter()
+            try:
+                self.collection.bulk_write(operations, ordered=False)
+            except Exception as e:
+                print(f"Error flushing {len(batch)} user preferences: {e}", file=sys.stderr)
+                self.failed_flushes += 1
+                self._requeue(batch)
+                return 0
+            elapsed = time.perf_counter() - start
+
+            self.flushes += 1
+            self.written += len(batch)
+            self.total_flush_time += elapsed
+            self.max_flush_time = max(self.max_flush_time, elapsed)
+            self.last_flush_time = elapsed
+            return len(batch)
+
+    def _requeue(self, batch):
+        """Put a failed batch back without overriding newer submissions or exceeding max_pending"""
+        with self.lock:
+            merged = OrderedDict(batch)
+            for user_id, preferences in self.pending.items():
+                merged.pop(user_id, None)
+                merged[user_id] = preferences
+            while len(merged) > self.max_pending:
+                merged.popitem(last=False)
+                self.dropped += 1
+            self.pending = merged
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def close(self):
+        """Stop the flusher thread and write whatever is still pending"""
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        self.wakeup.set()
+        self.thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def stats(self):
+        with self.lock:
+            pending = len(self.pending)
+        return {
+            'pending': pending,
+            'submitted': self.submitted,
+            'coalesced': self.coalesced,
+            'written': self.written,
+            'coalescing_ratio': self.submitted / self.written if self.written else 0.0,
+            'flushes': self.flushes,
+            'failed_flushes': self.failed_flushes,
+            'dropped': self.dropped,
+            'avg_flush_ms': self.total_flush_time / self.flushes * 1000 if self.flushes else 0.0,
+            'max_flush_ms': self.max_flush_time * 1000,
+            'last_flush_ms': self.last_flush_time * 1000
+        }
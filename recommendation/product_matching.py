@@ -0,0 +1,317 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+from collections import defaultdict
+from itertools import combinations
+import numpy as np
+from scipy.sparse import csr_matrix
+from catalog import DEFAULT_SOURCES, PROJECT_ROOT, read_sources
+
+# Every retailer file, including Reliance, which is matched but not served by the engines
+MATCH_SOURCES = DEFAULT_SOURCES + (
+    ('Reliance', os.path.join(PROJECT_ROOT, 'Reliance', 'reliance_data.json')),
+)
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'product_matches.json')
+
+# Pairs scoring below this cosine similarity are not reported
+MIN_SCORE = 0.5
+# Scores are rounded to this many decimals, so both ways of scoring a pair agree on ties
+SCORE_DECIMALS = 4
+# Listings of one retailer multiplied against a block of another at a time;
+# bounds the size of each sparse product
+CHUNK_SIZE = 2048
+# Blocks with at most this many listing pairs are scored together, pair by
+# pair, instead of with one sparse product each
+PAIRWISE_BLOCK = 1 << 12
+NGRAM = 3
+
+# Listing text that says nothing about which phone it is: marketing tails
+# after '|' or 'with ...' offers, spec sheets, RAM and generic words
+NAME_TAIL = re.compile(r'(?:\||\bwith (?:no cost emi|additional|offers?)\b|\bdisplay\s*:).*')
+NAME_NOISE = re.compile(r'\b(?:\d+\s*gb\s*ram|ram\s*\d+\s*gb|refurbished|(?:ai\s+)?smart\s?phones?|mobile phones?|storage)\b')
+CAPACITY = re.compile(r'\b(\d+)\s*(gb|tb)\b')
+NON_WORD = re.compile(r'[^a-z0-9+]+')
+# Name words that carry a model number ("y28e", "13", "s23"); network generations do not count
+MODEL_WORD = re.compile(r'^(?=.*\d)(?![45]g$)[a-z0-9]+$')
+
+# Characters left in compared names; n-grams are numbered in base len(ALPHABET) + 1
+ALPHABET = ' abcdefghijklmnopqrstuvwxyz0123456789+'
+_CHAR_CODES = np.full(256, len(ALPHABET), dtype=np.int64)
+_CHAR_CODES[np.frombuffer(ALPHABET.encode('ascii'), dtype=np.uint8)] = np.arange(len(ALPHABET))
+
+def match_key(name):
+    """Split a listing name into (text to compare, storage in GB or None, refurbished)
+
+    RAM and storage are removed from the text: storage is compared exactly by
+    blocking on it, and RAM variants of a model share their name otherwise.
+    """
+    name = NAME_TAIL.sub(' ', (name or '').lower())
+    refurbished = 'refurbished' in name
+    capacities = []
+    def capacity(match):
+        capacities.append(int(match.group(1)) * (1024 if match.group(2) == 'tb' else 1))
+        return ' '
+    name = CAPACITY.sub(capacity, NAME_NOISE.sub(' ', name))
+    # Names also list RAM without saying so ("12GB, 256GB Storage"); storage is the larger
+    storage = max(capacities) if capacities else None
+    return ' '.join(NON_WORD.sub(' ', name).split()), storage, refurbished
+
+def name_vectors(texts, n=NGRAM, chunk_size=1 << 16):
+    """L2-normalized TF-IDF vectors of the character n-grams of each text, as a CSR matrix
+
+    Weighted like TfidfVectorizer(analyzer='char', sublinear_tf=True) over
+    ' text ', but the n-grams of all texts are numbered and counted with
+    numpy instead of a Python loop per text.
+    """
+    if not len(texts):
+        return csr_matrix((0, 0), dtype=np.float32)
+    base = len(ALPHABET) + 1
+    span = base ** n
+    rows, grams, counts = [], [], []
+    for start in range(0, len(texts), chunk_size):
+        chunk = texts[start:start + chunk_size]
+        # One string for the whole chunk; '\n' is outside the alphabet, so no n-gram spans two texts
+        chars = _CHAR_CODES[np.frombuffer(''.join(f" {text} \n" for text in chunk).encode('ascii', 'replace'),
+                                          dtype=np.uint8)]
+        text_rows = np.repeat(np.arange(start, start + len(chunk)), [len(text) + 3 for text in chunk])
+        windows = np.lib.stride_tricks.sliding_window_view(chars, n)
+        valid = (windows < len(ALPHABET)).all(axis=1)
+        windows = windows[valid]
+        codes = text_rows[:len(valid)][valid] * span
+        for position in range(n):
+            codes += windows[:, position] * base ** (n - 1 - position)
+        keys, key_counts = np.unique(codes, return_counts=True)
+        rows.append(keys // span)
+        grams.append(keys % span)
+        counts.append(key_counts)
+    rows, grams, counts = np.concatenate(rows), np.concatenate(grams), np.concatenate(counts)
+
+    seen = np.zeros(span, dtype=bool)
+    seen[grams] = True
+    columns = (np.cumsum(seen) - 1)[grams]
+    idf = np.log((1 + len(texts)) / (1 + np.bincount(columns))) + 1
+    weights = (1 + np.log(counts)) * idf[columns]
+    weights /= np.sqrt(np.bincount(rows, weights ** 2, minlength=len(texts)))[rows]
+    return csr_matrix((weights.astype(np.float32), (rows, columns)), shape=(len(texts), int(seen.sum())))
+
+def model_number(text):
+    """The model number words of a compared name as a frozenset, or None if it has none"""
+    return frozenset(filter(MODEL_WORD.match, text.split())) or None
+
+def candidate_blocks(products, keys):
+    """Group listing rows by block, source and variant
+
+    Returns {(category, brand, refurbished): {source: {(storage, model): rows}}}.
+    Only listings of the same block and compatible variants are compared.
+    """
+    blocks = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
+    for row, (product, (text, storage, refurbished)) in enumerate(zip(products, keys)):
+        block = (product['category'], product['brand'].lower(), refurbished)
+        blocks[block][product['source']][storage, model_number(text)].append(row)
+    return blocks
+
+def _block_pairs(variants_a, variants_b):
+    """(rows of a, rows of b) to compare, one pair per variant of a
+
+    Variants are compatible when storage and model number are equal, or
+    unknown on either side; a listing without them is compared against
+    every variant of its block rather than dropped.
+    """
+    by_storage, by_model = defaultdict(list), defaultdict(list)
+    for storage, model in variants_b:
+        by_storage[storage].append((storage, model))
+        by_model[model].append((storage, model))
+
+    pairs = []
+    for (storage, model), rows_a in variants_a.items():
+        if storage is None and model is None:
+            compatible = list(variants_b)
+        elif storage is None:
+            compatible = by_model[model] + by_model[None]
+        elif model is None:
+            compatible = by_storage[storage] + by_storage[None]
+        else:
+            compatible = [key for key in ((storage, model), (None, model), (storage, None), (None, None))
+                          if key in variants_b]
+        if compatible:
+            pairs.append((np.array(rows_a), np.array([row for key in compatible for row in variants_b[key]])))
+    return pairs
+
+def _best_per_key(keys, scores, others):
+    """Positions of the highest score of each distinct key; ties go to the lowest other row"""
+    order = np.lexsort((others, -scores, keys))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = keys[order[1:]] != keys[order[:-1]]
+    return order[first]
+
+def _best_candidates(rows, cols, scores):
+    """Keep only the candidates that are the best of their row or of their column"""
+    keep = np.zeros(len(scores), dtype=bool)
+    keep[_best_per_key(rows, scores, cols)] = True
+    keep[_best_per_key(cols, scores, rows)] = True
+    return rows[keep], cols[keep], scores[keep]
+
+def _scored_candidates(vectors, rows_a, rows_b, min_score, chunk_size):
+    """Cosine scores of rows_a against rows_b as one sparse product per chunk of rows_a
+
+    TF-IDF rows are L2-normalized, so the product is the cosine similarity.
+    Only each chunk's row and column bests are kept, which still contain the
+    overall best match of every listing on both sides.
+    """
+    block_b = vectors[rows_b].T.tocsc()
+    for start in range(0, len(rows_a), chunk_size):
+        chunk = rows_a[start:start + chunk_size]
+        scores = (vectors[chunk] @ block_b).tocoo()
+        data = scores.data.round(SCORE_DECIMALS)
+        keep = data >= min_score
+        yield _best_candidates(chunk[scores.row[keep]], rows_b[scores.col[keep]], data[keep])
+
+def _block_product_pairs(blocks):
+    """Every (row of a, row of b) pair of a list of (rows_a, rows_b) blocks, built with numpy"""
+    sizes_a = np.array([len(rows_a) for rows_a, _ in blocks])
+    sizes_b = np.array([len(rows_b) for _, rows_b in blocks])
+    starts_a = np.cumsum(sizes_a) - sizes_a
+    starts_b = np.cumsum(sizes_b) - sizes_b
+    counts = sizes_a * sizes_b
+    block = np.repeat(np.arange(len(blocks)), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    rows = np.concatenate([rows_a for rows_a, _ in blocks])[starts_a[block] + local // sizes_b[block]]
+    cols = np.concatenate([rows_b for _, rows_b in blocks])[starts_b[block] + local % sizes_b[block]]
+    return rows, cols
+
+def _pair_scores(vectors, rows, cols, chunk_size=1 << 18):
+    """Cosine scores of (row, col) pairs as row-wise products of their sparse vectors"""
+    scores = np.empty(len(rows), dtype=np.float32)
+    for start in range(0, len(rows), chunk_size):
+        end = start + chunk_size
+        scores[start:end] = vectors[rows[start:end]].multiply(vectors[cols[start:end]]).sum(axis=1).A1
+    return scores.round(SCORE_DECIMALS)
+
+def best_matches(products, min_score=MIN_SCORE, chunk_size=CHUNK_SIZE):
+    """Find every listing's best match at each other retailer
+
+    Returns {(source, match_source): (rows, match_rows, scores)} as numpy
+    arrays of rows into products, for both directions of every retailer pair.
+    """
+    keys = [match_key(product['name']) for product in products]
+    vectors = name_vectors([text for text, _, _ in keys])
+
+    found = defaultdict(list)
+    small_blocks = defaultdict(list)
+    for by_source in candidate_blocks(products, keys).values():
+        for source_a, source_b in combinations(sorted(by_source), 2):
+            for rows_a, rows_b in _block_pairs(by_source[source_a], by_source[source_b]):
+                if len(rows_a) * len(rows_b) <= PAIRWISE_BLOCK:
+                    small_blocks[source_a, source_b].append((rows_a, rows_b))
+                else:
+                    found[source_a, source_b].extend(
+                        _scored_candidates(vectors, rows_a, rows_b, min_score, chunk_size))
+    for pair, blocks in small_blocks.items():
+        rows, cols = _block_product_pairs(blocks)
+        scores = _pair_scores(vectors, rows, cols)
+        keep = scores >= min_score
+        found[pair].append(_best_candidates(rows[keep], cols[keep], scores[keep]))
+
+    sources = sorted({product['source'] for product in products})
+    empty = (np.array([], dtype=np.int64),) * 2 + (np.array([], dtype=np.float32),)
+    matches = {}
+    for source_a, source_b in combinations(sources, 2):
+        candidates = found.get((source_a, source_b))
+        rows, cols, scores = (np.concatenate(part) for part in zip(*candidates)) if candidates else empty
+        for (source, match_source), own, other in (((source_a, source_b), rows, cols),
+                                                   ((source_b, source_a), cols, rows)):
+            best = _best_per_key(own, scores, other)
+            matches[source, match_source] = (own[best], other[best], scores[best])
+    return matches
+
+def match_records(products, matches):
+    """Per retailer pair, the JSON-ready best matches, highest score first"""
+    records = {}
+    for (source, match_source), (rows, match_rows, scores) in sorted(matches.items()):
+        order = np.argsort(-scores, kind='stable')
+        records[f"{match_source} vs {source}"] = [{
+            'id': products[row]['id'],
+            'name': products[row]['name'],
+            'price': products[row]['price'],
+            'match_id': products[match_row]['id'],
+            'match_name': products[match_row]['name'],
+            'match_price': products[match_row]['price'],
+            'score': round(score, SCORE_DECIMALS)
+        } for row, match_row, score in zip(rows[order].tolist(), match_rows[order].tolist(), scores[order].tolist())]
+    return records
+
+def _format_price(price):
+    return f"₹{price:,.0f}" if price else 'N/A'
+
+def comparison_rows(products, matches, anchor='Croma', required='Flipkart'):
+    """Rows in the Home/comparison_results.json format used by comparison2.html
+
+    One row per anchor listing that has a match at the required retailer,
+    with the price, link and "<retailer> vs <anchor> Score" of every other
+    retailer that has a match.
+    """
+    best = {}
+    for (source, match_source), (rows, match_rows, scores) in matches.items():
+        if source == anchor:
+            best[match_source] = dict(zip(rows.tolist(), zip(match_rows.tolist(), scores.tolist())))
+
+    results = []
+    for row in sorted(best.get(required, {})):
+        product = products[row]
+        result = {
+            f"{anchor} Product Name": product['name'],
+            f"{anchor} Price": _format_price(product['price']),
+            f"{anchor} Link": product['product_url']
+        }
+        for match_source in sorted(best, key=lambda source: source != required):
+            if row not in best[match_source]:
+                continue
+            match_row, score = best[match_source][row]
+            match = products[match_row]
+            result.update({
+                f"{match_source} Product Name": match['name'],
+                f"{match_source} Price": _format_price(match['price']),
+                f"{match_source} Link": match['product_url'],
+                f"{match_source} vs {anchor} Score": round(score, SCORE_DECIMALS)
+            })
+            if match_source == required:
+                result[f"{required} Product image link"] = match['image_url']
+        # comparison2.html reads the Amazon link under this older key
+        if 'Amazon Link' in result:
+            result['Amazon Product link'] = result.pop('Amazon Link')
+        results.append(result)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Match the same products across retailer files')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--comparison', help='Also write Croma/Flipkart/Amazon rows for comparison2.html here')
+    parser.add_argument('--min-score', type=float, default=MIN_SCORE)
+    args = parser.parse_args()
+
+    try:
+        start = time.perf_counter()
+        products = list({product['id']: product for product in read_sources(MATCH_SOURCES)}.values())
+        matches = best_matches(products, args.min_score)
+        records = match_records(products, matches)
+
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=1)
+        if args.comparison:
+            with open(args.comparison, 'w', encoding='utf-8') as f:
+                json.dump(comparison_rows(products, matches), f, ensure_ascii=False, indent=4)
+
+        print(f"Matched {len(products)} listings in {time.perf_counter() - start:.1f}s:")
+        for pair, pair_matches in records.items():
+            print(f"  {pair}: {len(pair_matches)}")
+    except Exception as e:
+        print(f"Error matching products: {e}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import sys
+
+FIELDS = ('id', 'name', 'brand', 'category', 'source', 'image_url', 'product_url', 'price', 'rating')
+FIELD_SET = frozenset(FIELDS)
+
+class ProductRecord:
+    """Compact catalog product: fixed __slots__ instead of a per-product dict
+
+    brand, category and source come from small closed sets of values, so they
+    are interned and every record shares one string object per value instead
+    of holding its own copy. Supports the read-only dict access the engines
+    use (product['name'], product.get('brand'), 'id' in product); convert with
+    to_dict() where the product leaves the process as JSON or a document.
+    """
+    __slots__ = FIELDS
+
+    def __init__(self, id, name, brand='', category='', source='', image_url='', product_url='',
+                 price=0.0, rating=0.0):
+        self.id = id
+        self.name = name
+        self.brand = sys.intern(brand or '')
+        self.category = sys.intern(category or '')
+        self.source = sys.intern(source or '')
+        self.image_url = image_url
+        self.product_url = product_url
+        self.price = float(price or 0)
+        self.rating = float(rating or 0)
+
+    @classmethod
+    def from_dict(cls, product):
+        return cls(**{field: product[field] for field in FIELDS if field in product})
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in FIELDS}
+
+    def __getitem__(self, field):
+        if field not in FIELD_SET:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def get(self, field, default=None):
+        return getattr(self, field) if field in FIELD_SET else default
+
+    def __contains__(self, field):
+        return field in FIELD_SET
+
+    def __repr__(self):
+        return f"ProductRecord({self.id!r}, {self.name!r})"
+
+def as_dict(product):
+    """Get a JSON-ready dict of a ProductRecord; dicts are returned as they are"""
+    return product.to_dict() if isinstance(product, ProductRecord) else product
@@ -0,0 +1,149 @@
+import sys
+import time
+import threading
+from collections import OrderedDict
+from preference_aggregator import activity_user
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL = 300
+
+class RecommendationCache:
+    """Bounded LRU/TTL cache of computed recommendation lists
+
+    Entries are keyed by (user_id, algorithm, catalog_version), so a catalog
+    reload never serves stale products, and all entries of a user are dropped
+    when new activity arrives for that user. A list computed while its user
+    was invalidated is returned but not stored, so it is not served later.
+    """
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.user_keys = {}
+        # {user_id: [computes in flight, generation]}; invalidate_user bumps the generation
+        self.computing = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.skipped = 0
+
+    def get(self, user_id, algorithm, catalog_version):
+        """Get a cached value, or None on a miss or expired entry"""
+        key = (user_id, algorithm, catalog_version)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, user_id, algorithm, catalog_version, value):
+        with self.lock:
+            self._store((user_id, algorithm, catalog_version), value)
+
+    def get_or_compute(self, user_id, algorithm, catalog_version, compute):
+        """Get a cached value or compute and store it
+
+        The value is not stored if the user was invalidated between the
+        lookup and the end of the compute, since it may predate that activity.
+        """
+        with self.lock:
+            in_flight = self.computing.setdefault(user_id, [0, 0])
+            in_flight[0] += 1
+            generation = in_flight[1]
+        try:
+            value = self.get(user_id, algorithm, catalog_version)
+            if value is None:
+                value = compute()
+                with self.lock:
+                    if in_flight[1] == generation:
+                        self._store((user_id, algorithm, catalog_version), value)
+                    else:
+                        self.skipped += 1
+            return value
+        finally:
+            with self.lock:
+                in_flight[0] -= 1
+                if not in_flight[0]:
+                    del self.computing[user_id]
+
+    def invalidate_user(self, user_id):
+        """Drop every cached list of a user (called when their activity changes)"""
+        with self.lock:
+            in_flight = self.computing.get(user_id)
+            if in_flight is not None:
+                in_flight[1] += 1
+            keys = self.user_keys.pop(user_id, set())
+            for key in keys:
+                self.entries.pop(key, None)
+            if keys:
+                self.invalidations += 1
+            return len(keys)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.user_keys.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'skipped': self.skipped
+            }
+
+    def _store(self, key, value):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        self.user_keys.setdefault(key[0], set()).add(key)
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        self.entries.pop(key, None)
+        keys = self.user_keys.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.user_keys[key[0]]
+
+def watch_activity_changes(collection, cache, on_change=None):
+    """Invalidate cached users as new useractivities documents are inserted
+
+    on_change, if given, is called with the user ids instead of
+    cache.invalidate_user, e.g. to refresh preferences before invalidating.
+
+    Uses a MongoDB change stream, which needs a replica set or Atlas; on a
+    standalone server the watcher logs and exits, and invalidation relies on
+    the /api/cache/invalidate endpoint instead.
+    """
+    def run():
+        try:
+            with collection.watch([{'$match': {'operationType': 'insert'}}]) as stream:
+                for change in stream:
+                    user_id = activity_user(change.get('fullDocument', {}))
+                    if user_id and on_change:
+                        on_change([user_id])
+                    elif user_id:
+                        cache.invalidate_user(user_id)
+        except Exception as e:
+            print(f"Activity change stream unavailable: {e}", file=sys.stderr)
+
+    thread = threading.Thread(target=run, name='activity-cache-invalidator', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+import socket
+import http.client
+from urllib.parse import quote
+
+# Only the standard library is imported here so that forwarding a request to
+# the recommendation server does not pay for numpy/pandas/sklearn start-up.
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 5050
+DEFAULT_TIMEOUT = 5.0
+
+def get_server_address():
+    """Get the recommendation server address from environment variables"""
+    socket_path = os.getenv('RECOMMENDATION_SOCKET')
+    if socket_path:
+        return {'socket': socket_path}
+    return {
+        'host': os.getenv('RECOMMENDATION_HOST', DEFAULT_HOST),
+        'port': int(os.getenv('RECOMMENDATION_PORT', DEFAULT_PORT))
+    }
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection over a unix domain socket"""
+    def __init__(self, socket_path, timeout=DEFAULT_TIMEOUT):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+def _open_connection(address, timeout):
+    if address.get('socket'):
+        return UnixHTTPConnection(address['socket'], timeout=timeout)
+    return http.client.HTTPConnection(address['host'], address['port'], timeout=timeout)
+
+def fetch_recommendations(user_email, address=None, timeout=DEFAULT_TIMEOUT):
+    """Ask a running recommendation server for a user's recommendations
+
+    Raises OSError when the server cannot be reached so callers can fall
+    back to computing recommendations in-process.
+    """
+    address = address or get_server_address()
+    connection = _open_connection(address, timeout)
+    try:
+        connection.request('GET', '/recommendations/' + quote(user_email, safe=''))
+        response = connection.getresponse()
+        body = response.read()
+    except (http.client.HTTPException, socket.timeout) as e:
+        raise ConnectionError(f"Recommendation server request failed: {e}")
+    finally:
+        connection.close()
+
+    payload = json.loads(body.decode('utf-8'))
+    if response.status != 200 or not payload.get('success'):
+        raise ConnectionError(payload.get('error', f"HTTP {response.status}"))
+    return payload['data']
+
+def serialize_recommendations(recommendations):
+    """Convert recommendations to a JSON-serializable list"""
+    serializable_recommendations = []
+    for rec in recommendations or []:
+        try:
+            serializable_rec = {
+                'id': str(rec.get('id', '')),
+                'name': str(rec.get('name', '')),
+                'brand': str(rec.get('brand', '')),
+                'price': float(str(rec.get('price', '0')).replace('₹', '').replace(',', '').strip() or 0),
+                'source': str(rec.get('source', '')),
+                'image_url': str(rec.get('image_url', '')),
+                'product_url': str(rec.get('product_url', ''))
+            }
+            serializable_recommendations.append(serializable_rec)
+        except Exception as e:
+            print(f'Error processing recommendation: {str(e)}', file=sys.stderr)
+            continue
+    return serializable_recommendations
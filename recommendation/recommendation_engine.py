@@ -7,7 +7,18 @@ from bson import ObjectId
 from datetime import datetime, timedelta
 from sklearn.metrics.pairwise import cosine_similarity
 from dotenv import load_dotenv
-from mongodb_connection import get_collection
+from mongodb_connection import get_collection, get_database
+from catalog_sync import is_catalog_current, sync_catalog
+from catalog import load_catalog
+from product_record import ProductRecord, as_dict
+from item_similarity import ItemSimilarityTable
+from catalog_columns import CatalogColumns
+from name_index import NameIndex
+from preference_aggregator import PreferenceAggregator
+from mongodb_indexes import ensure_indexes
+from preference_writer import PreferenceWriteBuffer
+from activity_rollup import ROLLUP_COLLECTION
+from default_recommendations import DefaultRecommendations
 import sys
 
 # Load environment variables
@@ -19,6 +30,8 @@ class MongoJSONEncoder(json.JSONEncoder):
             return str(obj)
         if isinstance(obj, datetime):
             return obj.isoformat()
+        if isinstance(obj, ProductRecord):
+            return obj.to_dict()
         return super().default(obj)
 
 class RecommendationEngine:
@@ -37,17 +50,47 @@ class RecommendationEngine:
         # Use exact collection names
         self.activities = get_collection('useractivities')
         self.products = get_collection('products')
-        self.user_preferences = get_collection('userpreferences')
+        self.preferences_collection = get_collection('userpreferences')
+        self.catalog_sync = get_collection('catalogsync')
+        
+        # Create any missing indexes the queries below rely on
+        try:
+            ensure_indexes(self.activities.database)
+        except Exception as e:
+            print(f"Error creating indexes: {e}", file=sys.stderr)
+            
+        self.catalog_version = None
+        self.defaults = DefaultRecommendations({})
+        self.catalog_columns = CatalogColumns([])
+        self.name_index = NameIndex([])
+        
+        # Precomputed item-item neighbors (built offline by item_similarity.py)
+        self.item_similarity = ItemSimilarityTable.load()
         
         # Load product data from JSON files
         self.load_product_data()
         
+        # Stored preferences are written behind the request, batched per user
+        self.preference_writer = PreferenceWriteBuffer(
+            self.preferences_collection,
+            batch_size=int(os.getenv('PREFERENCE_WRITE_BATCH', 200)),
+            flush_interval=float(os.getenv('PREFERENCE_WRITE_INTERVAL', 2.0))
+        )
+        
+        # Per-user preference counters, updated from new activities only
+        self.aggregator = PreferenceAggregator(
+            self.activities,
+            lambda product_id: self.product_data.get(product_id),
+            self.catalog_version,
+            rollups=get_collection(ROLLUP_COLLECTION)
+        )
+        
     def connect_to_mongodb(self):
         """Connect to MongoDB database"""
         try:
-            print(f"Connecting to MongoDB with URI: {self.mongo_uri}")
-            self.client = MongoClient(self.mongo_uri)
-            self.db = self.client.get_database('Pricely')
+            # Reuse the shared pooled client rather than opening another one
+            self.db = get_database()
+            self.client = self.db.client
             print(f"Connected to MongoDB: {self.db.name}")
             
             # List all collections
@@ -60,68 +103,43 @@ class RecommendationEngine:
             return False
             
     def load_product_data(self):
-        """Load product data from JSON files into MongoDB"""
+        """Map the normalized product catalog and sync it into MongoDB"""
         try:
-            # Get the directory where this script is located
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            project_root = os.path.dirname(script_dir)
-            
-            # Define file paths
-            amazon_path = os.path.join(project_root, "Amazon", "amazon_products.json")
-            croma_path = os.path.join(project_root, "Croma", "croma_mobiles_2.json")
-            flipkart_path = os.path.join(project_root, "Home", "flipkart_mobiles_2.json")
-            
-            # Clear existing products
-            self.products.delete_many({})
-            
-            # Load Amazon products
-            with open(amazon_path, 'r', encoding='utf-8') as f:
-                amazon_products = json.load(f)
-                for product in amazon_products:
-                    self.products.insert_one({
-                        'id': product.get('Product Link', ''),
-                        'name': product.get('Product Name', ''),
-                        'brand': product.get('Brand', ''),
-                        'price': float(str(product.get('Price', '0')).replace('₹', '').replace(',', '').strip() or 0),
-                        'source': 'Amazon',
-                        'image_url': product.get('Image URL', ''),
-                        'product_url': product.get('Product Link', ''),
-                        'category': 'mobile'
-                    })
-            
-            # Load Croma products
-            with open(croma_path, 'r', encoding='utf-8') as f:
-                croma_products = json.load(f)
-                for product in croma_products:
-                    self.products.insert_one({
-                        'id': product.get('Product Link', ''),
-                        'name': product.get('Product Name', ''),
-                        'brand': product.get('Brand', ''),
-                        'price': float(str(product.get('Price', '0')).replace('₹', '').replace(',', '').strip() or 0),
-                        'source': 'Croma',
-                        'image_url': product.get('Image URL', ''),
-                        'product_url': product.get('Product Link', ''),
-                        'category': 'mobile'
-                    })
-            
-            # Load Flipkart products
-            with open(flipkart_path, 'r', encoding='utf-8') as f:
-                flipkart_products = json.load(f)
-                for product in flipkart_products:
-                    self.products.insert_one({
-                        'id': product.get('Product Link', ''),
-                        'name': product.get('Product Name', ''),
-                        'brand': product.get('Brand', ''),
-                        'price': float(str(product.get('Price', '0')).replace('₹', '').replace(',', '').strip() or 0),
-                        'source': 'Flipkart',
-                        'image_url': product.get('Image URL', ''),
-                        'product_url': product.get('Product Link', ''),
-                        'category': 'mobile'
-                    })
+            catalog = load_catalog()
+            
+            # Products (as ProductRecords), columns and name index are views
+            # over the shared memory-mapped catalog file, not per-process copies
+            product_data = catalog.by_id
+            self.product_data = product_data
+            self.catalog_columns = CatalogColumns.from_mapped(catalog.mapped)
+            self.name_index = NameIndex.from_mapped(catalog.mapped)
+            self.catalog_version = catalog.version
+            
+            # Cold-start lists only depend on the catalog; swap in the new set at once
+            self.defaults = DefaultRecommendations(product_data, catalog.version)
+            
+            # Only write to MongoDB when the source files changed since the last sync
+            if is_catalog_current(self.catalog_sync, catalog.version):
+                print(f"Product catalog {catalog.version} already synced", file=sys.stderr)
+            else:
+                documents = {product['id']: product for product in catalog.products}
+                stats = sync_catalog(self.products, self.catalog_sync, documents, catalog.version, catalog.files)
+                print(f"Synced product catalog {catalog.version}: {stats}", file=sys.stderr)
+            
+            return True
         except Exception as e:
             print(f"Error loading product data: {str(e)}", file=sys.stderr)
             raise
             
+    def read_product_files(self):
+        """Read the normalized catalog as plain dicts, for offline scripts
+        
+        Returns (product_data, per-file hashes, catalog version).
+        """
+        catalog = load_catalog()
+        product_data = {product['id']: product for product in catalog.products}
+        return product_data, catalog.files, catalog.version
+            
     def load_user_activities(self):
         """Load user activities from MongoDB"""
         try:
@@ -248,12 +266,25 @@ class RecommendationEngine:
             }
             return True
             
+    def refresh_preferences(self):
+        """Fold activities newer than the last refresh into the user preferences"""
+        try:
+            self.aggregator.set_catalog_version(self.catalog_version)
+            applied = self.aggregator.refresh()
+            if applied:
+                print(f"Applied {applied} new activities", file=sys.stderr)
+            self.user_preferences = self.aggregator.preferences
+            return True
+        except Exception as e:
+            print(f"Error refreshing user preferences: {e}", file=sys.stderr)
+            return False
+            
     def content_based_filtering(self, user_id):
         """Generate content-based recommendations"""
         try:
-        if user_id not in self.user_preferences:
+            if user_id not in self.user_preferences:
                 print(f"No preferences found for user {user_id}")
-            return []
+                return []
                 
             preferences = self.user_preferences[user_id]
             
@@ -262,33 +293,7 @@ class RecommendationEngine:
                 print(f"User {user_id} has no preferences, returning popular products")
                 return self.get_popular_products()
                 
-            # Calculate product scores based on user preferences
-            product_scores = {}
-            
-            for product_id, product in self.product_data.items():
-                score = 0
-                
-                # Brand preference
-                if product.get('brand') in preferences['viewed_brands']:
-                    score += preferences['viewed_brands'][product['brand']] * 2
-                    
-                # Category preference
-                if product.get('category') in preferences['viewed_categories']:
-                    score += preferences['viewed_categories'][product['category']] * 1.5
-                    
-                # Phone name preference
-                for phone_name, count in preferences['phone_views'].items():
-                    if phone_name.lower() in product.get('name', '').lower():
-                        score += count * 3
-                        
-                if score > 0:
-                    product_scores[product_id] = score
-                    
-            # Sort products by score
-            sorted_products = sorted(product_scores.items(), key=lambda x: x[1], reverse=True)
-            
-            # Return top 5 products
-            return [product_id for product_id, _ in sorted_products[:5]]
+            return self.score_recommendations(user_id)['content_based']
             
         except Exception as e:
             print(f"Error in content-based filtering: {e}")
@@ -297,9 +302,9 @@ class RecommendationEngine:
     def collaborative_filtering(self, user_id):
         """Generate collaborative filtering recommendations"""
         try:
-        if user_id not in self.user_preferences:
+            if user_id not in self.user_preferences:
                 print(f"No preferences found for user {user_id}")
-            return []
+                return []
             
             preferences = self.user_preferences[user_id]
             
@@ -308,28 +313,7 @@ class RecommendationEngine:
                 print(f"User {user_id} has no preferences, returning popular products")
                 return self.get_popular_products()
                 
-            # Calculate product scores based on user preferences
-            product_scores = {}
-            
-            for product_id, product in self.product_data.items():
-                score = 0
-                
-                # Viewed products
-                if product_id in preferences['viewed_products']:
-                    score += preferences['viewed_products'][product_id] * 2
-                    
-                # Clicked products
-                if product_id in preferences['clicked_products']:
-                    score += preferences['clicked_products'][product_id] * 3
-                    
-                if score > 0:
-                    product_scores[product_id] = score
-                    
-            # Sort products by score
-            sorted_products = sorted(product_scores.items(), key=lambda x: x[1], reverse=True)
-            
-            # Return top 5 products
-            return [product_id for product_id, _ in sorted_products[:5]]
+            return self.score_recommendations(user_id)['collaborative']
             
         except Exception as e:
             print(f"Error in collaborative filtering: {e}")
@@ -349,37 +333,64 @@ class RecommendationEngine:
                 print(f"User {user_id} has no preferences, returning popular products")
                 return self.get_popular_products()
                 
-            # Get content-based recommendations
-            content_recs = self.content_based_filtering(user_id)
-            
-            # Get collaborative recommendations
-            collab_recs = self.collaborative_filtering(user_id)
-            
-            # Combine recommendations with weights
-            combined_scores = {}
-            
-            # Add content-based recommendations with weight 0.6
-            for product_id in content_recs:
-                if product_id not in combined_scores:
-                    combined_scores[product_id] = 0
-                combined_scores[product_id] += 0.6
-                
-            # Add collaborative recommendations with weight 0.4
-            for product_id in collab_recs:
-                if product_id not in combined_scores:
-                    combined_scores[product_id] = 0
-                combined_scores[product_id] += 0.4
-                
-            # Sort by combined score
-            sorted_products = sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)
-            
-            # Return top 5 products
-            return [product_id for product_id, _ in sorted_products[:5]]
+            return self.score_recommendations(user_id)['hybrid']
             
         except Exception as e:
             print(f"Error in hybrid recommendation: {e}")
             return self.get_popular_products()
         
+    def score_recommendations(self, user_id, n=5):
+        """Score the catalog once and rank content-based, collaborative and hybrid lists
+        
+        All three algorithms are computed from the same vectorized pass over
+        the catalog columns instead of one scan per algorithm.
+        """
+        preferences = self.user_preferences[user_id]
+        columns = self.catalog_columns
+        
+        # Content-based: brand, category and viewed phone names
+        content_scores = columns.weights('brand', preferences['viewed_brands']) * 2
+        content_scores += columns.weights('category', preferences['viewed_categories']) * 1.5
+        for phone_name, count in preferences['phone_views'].items():
+            content_scores[self.name_index.search(phone_name)] += count * 3
+        content_recs = columns.top_n(content_scores, n)
+        
+        # Collaborative: interaction strength of viewed and clicked products
+        collab_scores = columns.scatter(preferences['viewed_products']) * 2
+        collab_scores += columns.scatter(preferences['clicked_products']) * 3
+        collab_recs = []
+        
+        # People who viewed these also viewed: cost depends on the user's items, not on other users
+        if self.item_similarity is not None:
+            item_weights = {}
+            for product_id, count in preferences['viewed_products'].items():
+                item_weights[product_id] = item_weights.get(product_id, 0) + count * 2
+            for product_id, count in preferences['clicked_products'].items():
+                item_weights[product_id] = item_weights.get(product_id, 0) + count * 3
+                
+            neighbors = self.item_similarity.recommend(item_weights, n=None)
+            collab_recs = [product_id for product_id, _ in neighbors if product_id in self.product_data][:n]
+        if not collab_recs:
+            collab_recs = columns.top_n(collab_scores, n)
+            
+        # Hybrid: content-based recommendations weigh 0.6, collaborative 0.4
+        combined_scores = {}
+        for product_id in content_recs:
+            combined_scores[product_id] = combined_scores.get(product_id, 0) + 0.6
+        for product_id in collab_recs:
+            combined_scores[product_id] = combined_scores.get(product_id, 0) + 0.4
+        sorted_products = sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)
+        
+        return {
+            'content_based': content_recs,
+            'collaborative': collab_recs,
+            'hybrid': [product_id for product_id, _ in sorted_products[:n]]
+        }
+        
+    def has_preferences(self, user_id):
+        """Whether a user has viewed anything the algorithms can build on"""
+        return bool(self.user_preferences.get(user_id, {}).get('viewed_products'))
+        
     def generate_recommendations(self, user_id):
         """Generate recommendations for a user"""
         try:
@@ -388,22 +399,19 @@ class RecommendationEngine:
                 if not self.load_product_data():
                     return self._get_default_recommendations()
                     
-            if not self.user_activities:
-                if not self.load_user_activities():
-                    return self._get_default_recommendations()
-                    
-            # Extract user preferences if not already extracted
-            if not self.user_preferences:
-                self.extract_user_preferences()
+            # Apply activities recorded since the last request
+            if not self.refresh_preferences():
+                return self._get_default_recommendations()
                 
             # If user has no preferences, provide different default recommendations
-            if not self.user_preferences.get(user_id, {}).get('viewed_products'):
+            if not self.has_preferences(user_id):
                 return self._get_default_recommendations()
                 
-            # Generate recommendations using different algorithms
-            content_based_recs = self.content_based_filtering(user_id) or []
-            collaborative_recs = self.collaborative_filtering(user_id) or []
-            hybrid_recs = self.hybrid_recommendation(user_id) or []
+            # Generate recommendations for all algorithms in one scoring pass
+            scored = self.score_recommendations(user_id)
+            content_based_recs = scored['content_based']
+            collaborative_recs = scored['collaborative']
+            hybrid_recs = scored['hybrid']
             
             # If any algorithm returns no recommendations, use defaults
             if not content_based_recs:
@@ -427,107 +435,21 @@ class RecommendationEngine:
             
     def _get_default_recommendations(self):
         """Get default recommendations when no user preferences are available"""
-        products = list(self.product_data.values())
-        
-        # Remove duplicates based on name and brand
-        unique_products = {}
-        for p in products:
-            key = f"{p['name']}_{p['brand']}"
-            if key not in unique_products:
-                unique_products[key] = p
-        products = list(unique_products.values())
-        
-        # Content-based default: Sort by brand popularity
-        brand_counts = {}
-        for p in products:
-            brand = p['brand']
-            brand_counts[brand] = brand_counts.get(brand, 0) + 1
-            
-        content_based_products = sorted(products, 
-            key=lambda x: (brand_counts.get(x['brand'], 0), -x['price']), 
-            reverse=True
-        )[:10]
-        
-        # Collaborative default: Sort by price (most affordable)
-        collaborative_products = sorted(products, 
-            key=lambda x: x['price']
-        )[:10]
-        
-        # Hybrid default: Sort by brand popularity and price
-        hybrid_products = sorted(products,
-            key=lambda x: (brand_counts.get(x['brand'], 0) * 0.7, -x['price'] * 0.3),
-            reverse=True
-        )[:10]
-        
-        # Ensure all products have required fields
-        def validate_product(p):
-            return all(key in p for key in ['id', 'name', 'brand', 'price', 'source'])
-            
-        content_based_products = [p for p in content_based_products if validate_product(p)]
-        collaborative_products = [p for p in collaborative_products if validate_product(p)]
-        hybrid_products = [p for p in hybrid_products if validate_product(p)]
-        
-        # Ensure unique products across all recommendation types
-        seen_ids = set()
-        unique_content_based = []
-        unique_collaborative = []
-        unique_hybrid = []
-        
-        # Process hybrid recommendations first
-        for p in hybrid_products:
-            if p['id'] not in seen_ids:
-                seen_ids.add(p['id'])
-                unique_hybrid.append(p)
-                
-        # Then content-based
-        for p in content_based_products:
-            if p['id'] not in seen_ids:
-                seen_ids.add(p['id'])
-                unique_content_based.append(p)
-                
-        # Finally collaborative
-        for p in collaborative_products:
-            if p['id'] not in seen_ids:
-                seen_ids.add(p['id'])
-                unique_collaborative.append(p)
-        
-        return {
-            'content_based': [{
-                'product_id': p['id'],
-                'product': p,
-                'score': 1.0,
-                'algorithm': 'content-based-default'
-            } for p in unique_content_based],
-            'collaborative': [{
-                'product_id': p['id'],
-                'product': p,
-                'score': 1.0,
-                'algorithm': 'collaborative-default'
-            } for p in unique_collaborative],
-            'hybrid': [{
-                'product_id': p['id'],
-                'product': p,
-                'score': 1.0,
-                'algorithm': 'hybrid-default'
-            } for p in unique_hybrid]
-        }
+        # Built once per catalog version in load_product_data
+        return self.defaults.recommendations
         
     def get_recommendations(self, user_id):
         """Get recommendations for a user"""
         try:
             print(f"\nGetting recommendations for user: {user_id}")
             
-            # Load user activities and extract preferences
-            if not self.load_user_activities():
-                print("Failed to load user activities, using default recommendations")
-                return self._get_default_recommendations()
-                
-            if not self.extract_user_preferences():
-                print("Failed to extract user preferences, using default recommendations")
+            # Apply activities recorded since the last request
+            if not self.refresh_preferences():
+                print("Failed to refresh user preferences, using default recommendations")
                 return self._get_default_recommendations()
                 
             # Check if user has any activity
-            if user_id not in self.user_activities or not self.user_activities[user_id]:
+            if not self.aggregator.activity_counts.get(user_id):
                 print(f"No activities found for user {user_id}")
                 return self._get_default_recommendations()
                 
@@ -551,23 +473,37 @@ class RecommendationEngine:
             # If still no recommendations, use default
             if not recommendations:
                 print("No recommendations found, using default")
-                recommendations = self._get_default_recommendations()
+                recommendations = [rec['product'] for rec in self._get_default_recommendations()['hybrid']]
                 
             # Convert recommendations to list and remove duplicates
             seen_ids = set()
             unique_recommendations = []
             for rec in recommendations:
-                if rec['id'] not in seen_ids:
+                # The algorithms return product ids
+                if isinstance(rec, str):
+                    rec = self.product_data.get(rec)
+                if rec and rec['id'] not in seen_ids:
                     seen_ids.add(rec['id'])
                     unique_recommendations.append(rec)
                     
             # Limit to 5 recommendations
-            return unique_recommendations[:5]
+            return [as_dict(rec) for rec in unique_recommendations[:5]]
             
         except Exception as e:
             print(f"Error getting recommendations: {e}")
             return self._get_default_recommendations()
         
+    def _resolve_products(self, product_ids):
+        """Look up products by id from the loaded catalog, with one $in query for the rest"""
+        product_ids.discard(None)
+        products = {product_id: self.product_data[product_id] for product_id in product_ids
+                    if product_id in self.product_data}
+        missing = [product_id for product_id in product_ids if product_id not in products]
+        if missing:
+            for product in self.products.find({'id': {'$in': missing}}, {'_id': 0, 'id': 1, 'brand': 1, 'price': 1}):
+                products[product['id']] = product
+        return products
+
     def get_user_preferences(self, user_id):
         """Get user preferences based on their activity"""
         # Get user activities from the last 30 days
@@ -575,11 +511,14 @@ class RecommendationEngine:
         user_activities = list(self.activities.find({
             'user_id': user_id,
             'timestamp': {'$gte': thirty_days_ago}
-        }))
+        }, {'_id': 0, 'product_id': 1, 'action': 1}))
         
         if not user_activities:
             return None
         
+        # Resolve every distinct product once instead of one query per activity
+        products = self._resolve_products({activity.get('product_id') for activity in user_activities})
+        
         # Extract preferences
         preferences = {
             'viewed_products': [],
@@ -590,53 +529,43 @@ class RecommendationEngine:
         }
         
         for activity in user_activities:
-            product_id = activity.get('product_id')
+            product = products.get(activity.get('product_id'))
+            if not product:
+                continue
+            product_id = activity['product_id']
             action = activity.get('action')
             
-            if product_id:
-                product = self.products.find_one({'id': product_id})
-                if product:
-                    if action == 'view':
-                        preferences['viewed_products'].append(product_id)
-                    elif action == 'click':
-                        preferences['clicked_products'].append(product_id)
-                    
-                    # Track brand preferences
-                    brand = product.get('brand')
-                    if brand:
-                        preferences['brands'][brand] = preferences['brands'].get(brand, 0) + 1
-                    
-                    # Track price range
-                    price = product.get('price', 0)
-                    preferences['price_range']['min'] = min(preferences['price_range']['min'], price)
-                    preferences['price_range']['max'] = max(preferences['price_range']['max'], price)
+            if action == 'view':
+                preferences['viewed_products'].append(product_id)
+            elif action == 'click':
+                preferences['clicked_products'].append(product_id)
+            
+            # Track brand preferences
+            brand = product.get('brand')
+            if brand:
+                preferences['brands'][brand] = preferences['brands'].get(brand, 0) + 1
+            
+            # Track price range
+            price = product.get('price', 0)
+            preferences['price_range']['min'] = min(preferences['price_range']['min'], price)
+            preferences['price_range']['max'] = max(preferences['price_range']['max'], price)
         
         # Store preferences
-        self.user_preferences.update_one(
-            {'user_id': user_id},
-            {'$set': preferences},
-            upsert=True
-        )
+        self.preference_writer.submit(user_id, preferences)
         
         return preferences 
 
-    def get_popular_products(self):
-        """Get popular products based on user activities"""
+    def get_popular_products(self, n=5):
+        """Get the most popular products by time-decayed views and clicks"""
         try:
-            # Count product views across all users
-            product_views = {}
-            for user_id, activities in self.user_activities.items():
-                for activity in activities:
-                    if activity.get('action') == 'view':
-                        product_id = activity.get('product_id')
-                        if product_id:
-                            product_views[product_id] = product_views.get(product_id, 0) + 1
-                            
-            # Sort products by view count
-            sorted_products = sorted(product_views.items(), key=lambda x: x[1], reverse=True)
-            
-            # Return top 5 most viewed products
-            return [product_id for product_id, _ in sorted_products[:5]]
+            popularity = self.aggregator.popularity
+            ranked = popularity.top_products(n)
+            popular = [product_id for product_id, _ in ranked if product_id in self.product_data]
+            if len(popular) < n and len(ranked) == n:
+                # Some leaders left the catalog; look further down the ranking
+                ranked = popularity.top_products(popularity.products.capacity)
+                popular = [product_id for product_id, _ in ranked if product_id in self.product_data]
+            return popular[:n]
             
         except Exception as e:
             print(f"Error getting popular products: {e}")
@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import argparse
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+from dotenv import load_dotenv
+from recommendation_client import DEFAULT_HOST, DEFAULT_PORT, serialize_recommendations
+
+# Load environment variables
+load_dotenv()
+
+class RecommendationService:
+    """Keeps a single warm RecommendationEngine for the lifetime of the process"""
+    def __init__(self, engine=None):
+        if engine is None:
+            from recommendation_engine import RecommendationEngine
+            engine = RecommendationEngine()
+        self.engine = engine
+        # The engine mutates its in-memory state while answering, so requests
+        # are served one at a time against it
+        self.lock = threading.Lock()
+
+    def get_recommendations(self, user_email):
+        with self.lock:
+            recommendations = self.engine.get_recommendations(user_email)
+        if not isinstance(recommendations, list):
+            return []
+        return serialize_recommendations(recommendations)
+
+class RecommendationRequestHandler(BaseHTTPRequestHandler):
+    """Serves GET /health and GET /recommendations/<user_email>"""
+    service = None
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/health':
+            self._send_json(200, {'success': True, 'data': {'status': 'ok'}})
+            return
+
+        if path.startswith('/recommendations/'):
+            user_email = unquote(path[len('/recommendations/'):])
+            if not user_email:
+                self._send_json(400, {'success': False, 'error': 'No user email provided'})
+                return
+            try:
+                recommendations = self.service.get_recommendations(user_email)
+                self._send_json(200, {'success': True, 'data': recommendations})
+            except Exception as e:
+                print(f"Error generating recommendations: {e}", file=sys.stderr)
+                self._send_json(500, {'success': False, 'error': str(e)})
+            return
+
+        self._send_json(404, {'success': False, 'error': 'Not found'})
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix domain sockets have no peer address
+        if isinstance(self.client_address, tuple):
+            return super().address_string()
+        return 'unix'
+
+    def log_message(self, format, *args):
+        print(f"{self.address_string()} - {format % args}", file=sys.stderr)
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP server listening on a unix domain socket"""
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+
+def create_server(service, socket_path=None, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Create an HTTP server bound to a unix socket or a localhost port"""
+    handler = type('BoundRecommendationRequestHandler', (RecommendationRequestHandler,), {'service': service})
+    if socket_path:
+        return UnixHTTPServer(socket_path, handler)
+    return ThreadingHTTPServer((host, port), handler)
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the persistent recommendation server')
+    parser.add_argument('--socket', default=os.getenv('RECOMMENDATION_SOCKET'),
+                        help='Unix socket path to listen on (overrides --host/--port)')
+    parser.add_argument('--host', default=os.getenv('RECOMMENDATION_HOST', DEFAULT_HOST))
+    parser.add_argument('--port', type=int, default=int(os.getenv('RECOMMENDATION_PORT', DEFAULT_PORT)))
+    args = parser.parse_args()
+
+    print("Initializing recommendation engine...", file=sys.stderr)
+    service = RecommendationService()
+    server = create_server(service, socket_path=args.socket, host=args.host, port=args.port)
+
+    where = args.socket if args.socket else f"http://{args.host}:{args.port}"
+    print(f"Recommendation server listening on {where}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+if __name__ == "__main__":
+    main()
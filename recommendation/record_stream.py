@@ -0,0 +1,85 @@
+import json
+
+CHUNK_SIZE = 1 << 16
+# Give up on an array element that is still incomplete after this many characters
+MAX_RECORD_SIZE = 1 << 24
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\r\n'
+
+def iter_json_records(path, chunk_size=CHUNK_SIZE):
+    """Yield the records of a JSON array file or a newline-delimited JSON file one at a time
+
+    The format is detected from the first non-whitespace character: '['
+    starts a JSON array, anything else is read as one JSON value per line.
+    Only the current chunk and the record being decoded are held in memory,
+    whatever the file size; what the consumer keeps is up to it.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        head = f.read(chunk_size)
+        while head and not head.strip(_WHITESPACE):
+            more = f.read(chunk_size)
+            if not more:
+                break
+            head += more
+        start = len(head) - len(head.lstrip(_WHITESPACE))
+        if head[start:start + 1] == '[':
+            yield from _iter_array(f, head, start + 1, chunk_size)
+        else:
+            yield from _iter_lines(f, head, path)
+
+def _iter_lines(f, head, path):
+    for number, line in enumerate(_chain_lines(f, head), 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{number}: {e}") from None
+
+def _chain_lines(f, head):
+    """Lines of the file, given its first chunk was already read into head"""
+    lines = head.split('\n')
+    for line in lines[:-1]:
+        yield line
+    partial = lines[-1]
+    for line in f:
+        yield partial + line
+        partial = ''
+    if partial:
+        yield partial
+
+def _iter_array(f, buffer, position, chunk_size):
+    eof = False
+    while True:
+        # Skip to the next element, reading more when the buffer runs out
+        while True:
+            while position < len(buffer) and buffer[position] in _WHITESPACE + ',':
+                position += 1
+            if position < len(buffer) or eof:
+                break
+            buffer, position = f.read(chunk_size), 0
+            eof = not buffer
+
+        if position >= len(buffer):
+            raise ValueError("Unterminated JSON array")
+        if buffer[position] == ']':
+            return
+
+        try:
+            record, end = _decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            record, end = None, None
+        # A record decoded up to the very end of the buffer may be cut off (e.g. a number)
+        if end is None or (end == len(buffer) and not eof):
+            if eof or len(buffer) - position > MAX_RECORD_SIZE:
+                raise ValueError("Invalid JSON array element")
+            more = f.read(chunk_size)
+            eof = not more
+            buffer, position = buffer[position:] + more, 0
+            continue
+
+        yield record
+        position = end
+        # Drop what has been consumed so the buffer stays about one chunk long
+        if position > chunk_size:
+            buffer, position = buffer[position:], 0
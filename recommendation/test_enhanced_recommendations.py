@@ -1,56 +1,59 @@
 import os
 import sys
 import json
-from recommendation_engine import RecommendationEngine
+from recommendation_client import fetch_recommendations, serialize_recommendations
+
+def get_local_recommendations(user_email):
+    """Compute recommendations in-process (slow: loads the full engine)"""
+    from recommendation_engine import RecommendationEngine
+
+    # Initialize recommendation engine
+    engine = RecommendationEngine()
+
+    # Get recommendations
+    recommendations = engine.get_recommendations(user_email)
+
+    # If no recommendations, return empty list
+    if not recommendations:
+        return []
+
+    print(f"Found {len(recommendations)} recommendations", file=sys.stderr)
+
+    # Convert recommendations to JSON-serializable format
+    return serialize_recommendations(recommendations)
 
 def main():
     try:
+        args = sys.argv[1:]
+        local_only = '--local' in args
+        args = [arg for arg in args if arg != '--local']
+
         # Get user email from command line argument
-        if len(sys.argv) < 2:
+        if not args:
             print(json.dumps({'error': 'No user email provided'}), file=sys.stderr)
             return
-            
-        user_email = sys.argv[1]
+
+        user_email = args[0]
         print(f"Processing recommendations for user: {user_email}", file=sys.stderr)
-        
-        # Initialize recommendation engine
-        engine = RecommendationEngine()
-        
-        # Get recommendations
-        recommendations = engine.get_recommendations(user_email)
-        
-        # If no recommendations, return empty list
-        if not recommendations:
-            print(json.dumps([]))
-            return
-            
-        print(f"Found {len(recommendations)} recommendations", file=sys.stderr)
-        
-        # Convert recommendations to JSON-serializable format
-        serializable_recommendations = []
-        for rec in recommendations:
+
+        recommendations = None
+        if not local_only:
+            # Forward to the recommendation server when one is running
             try:
-                serializable_rec = {
-                    'id': str(rec.get('id', '')),
-                    'name': str(rec.get('name', '')),
-                    'brand': str(rec.get('brand', '')),
-                    'price': float(str(rec.get('price', '0')).replace('₹', '').replace(',', '').strip() or 0),
-                    'source': str(rec.get('source', '')),
-                    'image_url': str(rec.get('image_url', '')),
-                    'product_url': str(rec.get('product_url', ''))
-                }
-                serializable_recommendations.append(serializable_rec)
-            except Exception as e:
-                print(f'Error processing recommendation: {str(e)}', file=sys.stderr)
-                continue
-        
+                recommendations = fetch_recommendations(user_email)
+            except (OSError, ValueError) as e:
+                print(f"Recommendation server unavailable ({e}), computing locally", file=sys.stderr)
+
+        if recommendations is None:
+            recommendations = get_local_recommendations(user_email)
+
         # Output as JSON
-        result = json.dumps(serializable_recommendations)
+        result = json.dumps(recommendations)
         print(result)
-        
+
     except Exception as e:
         print(json.dumps({'error': str(e)}), file=sys.stderr)
         print(json.dumps([]))  # Return empty list on error
-        
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()